@@ -0,0 +1,159 @@
+"""Hot-reloaded access-control lists.
+
+Each list is parsed once into an immutable snapshot and swapped in whole
+when its file changes, so readers never lock or touch the filesystem beyond
+a throttled stat.
+"""
+
+import abc
+import bisect
+import ipaddress
+import json
+import os
+import signal
+import threading
+import time
+
+
+class FileStore(abc.ABC):
+    def __init__(self, path, check_interval=1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._snapshot = self.build([])
+        self._mtime = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self.reload()
+
+    @abc.abstractmethod
+    def build(self, entries):
+        pass
+
+    def snapshot(self):
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._next_check = now + self.check_interval
+            self._reload_if_changed()
+        return self._snapshot
+
+    def reload(self):
+        with self._lock:
+            self._load()
+
+    def invalidate(self):
+        self._mtime = -1
+        self._next_check = 0.0
+
+    def _reload_if_changed(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime != self._mtime and self._lock.acquire(blocking=False):
+            # Whoever loses the race keeps serving the current snapshot.
+            try:
+                self._load()
+            finally:
+                self._lock.release()
+
+    def _load(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            with open(self.path) as file:
+                entries = json.load(file)
+        except FileNotFoundError:
+            mtime, entries = None, []
+        except ValueError:
+            # Keep the last good snapshot while a file is being rewritten.
+            return
+        if not isinstance(entries, list):
+            # Valid JSON but not a list of entries; keep the last good one too.
+            return
+        self._snapshot = self.build(entries)
+        self._mtime = mtime
+
+
+class TokenStore(FileStore):
+    def build(self, entries):
+        return frozenset(entry for entry in entries if isinstance(entry, str))
+
+    def __contains__(self, token):
+        return token in self.snapshot()
+
+
+def _unmapped(network):
+    # ::ffff:a.b.c.d/n is the same block as a.b.c.d/(n - 96).
+    address = network.network_address
+    if network.version == 6 and address.ipv4_mapped and network.prefixlen >= 96:
+        return ipaddress.ip_network((address.ipv4_mapped, network.prefixlen - 96))
+    return network
+
+
+class IPBlocklist:
+    def __init__(self, entries):
+        # Single addresses are stored as /32 or /128 ranges, so every
+        # spelling of an address (IPv4-mapped included) matches the same way.
+        exact = set()
+        ranges = {4: [], 6: []}
+        for entry in entries:
+            if not isinstance(entry, str):
+                continue
+            try:
+                network = _unmapped(ipaddress.ip_network(entry, strict=False))
+            except ValueError:
+                # Not an address; the header can still carry it verbatim.
+                exact.add(entry)
+                continue
+            ranges[network.version].append(
+                (int(network.network_address), int(network.broadcast_address))
+            )
+        self.exact = frozenset(exact)
+        self.starts = {}
+        self.ends = {}
+        for version, spans in ranges.items():
+            merged = []
+            for start, end in sorted(spans):
+                if merged and start <= merged[-1][1] + 1:
+                    merged[-1][1] = max(merged[-1][1], end)
+                else:
+                    merged.append([start, end])
+            self.starts[version] = tuple(start for start, _ in merged)
+            self.ends[version] = tuple(end for _, end in merged)
+
+    def __contains__(self, ip):
+        if ip in self.exact:
+            return True
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return False
+        if address.version == 6 and address.ipv4_mapped is not None:
+            address = address.ipv4_mapped
+        value = int(address)
+        starts = self.starts[address.version]
+        index = bisect.bisect_right(starts, value) - 1
+        return index >= 0 and value <= self.ends[address.version][index]
+
+
+class BlocklistStore(FileStore):
+    def build(self, entries):
+        return IPBlocklist(entries)
+
+    def __contains__(self, ip):
+        if ip is None:
+            return False
+        return ip in self.snapshot()
+
+
+def reload_on_sighup(*stores):
+    def handler(signum, frame):
+        # Reload lazily on the next lookup; the interrupted frame may hold
+        # a store's lock.
+        for store in stores:
+            store.invalidate()
+
+    try:
+        signal.signal(signal.SIGHUP, handler)
+    except (AttributeError, ValueError):
+        # No SIGHUP on this platform, or not running in the main thread.
+        pass
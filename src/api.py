@@ -1,12 +1,46 @@
+import datetime
+import hashlib
+import json
+import logging
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 from dotenv import *
-from flask import Flask, request, jsonify
-from jsonschema import validate, ValidationError
+from flask import (
+    Flask,
+    Response,
+    copy_current_request_context,
+    g,
+    request,
+    jsonify,
+)
+from flask_cors import CORS
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
-from flask_cors import CORS
 import google.generativeai as genai
-import json
+from google.api_core.exceptions import DeadlineExceeded
+from jsonschema import Draft7Validator, ValidationError
+from limits import parse as parse_limit
+from limits.storage import storage_from_string
+
+import localmath
+import themes
+from acl import BlocklistStore, TokenStore, reload_on_sighup
+from cache import ResponseCache, normalize_prompt
+from logstore import LogWriter
+from metrics import registry, request_seconds, stage, timed
+from prompts import (
+    prompt_registry,
+    themium_prompt,
+    math_prompt,
+    ask_prompt,
+    teachme_prompt,
+)
+from ratelimit import QuotaExceeded, TokenQuota
+from singleflight import SingleFlight
+from streaming import sse_event, sse_response, wants_stream
+from upstream import PendingLimit, UpstreamBusy, UpstreamLimiter, response_usage
 
 app = Flask(__name__)
 CORS(app)
@@ -30,12 +64,36 @@ safety_settings = [
     {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_ONLY_HIGH"},
 ]
 
+context_cache_ttl = int(os.environ.get("CONTEXT_CACHE_TTL", 0))
+
+# Context caching needs a pinned model version. Only when it is on do inline
+# calls use the same version, so cached and uncached requests stay on the
+# same weights.
+model_name = "gemini-1.5-pro-001" if context_cache_ttl else "gemini-1.5-pro"
+
 model = genai.GenerativeModel(
-    model_name="gemini-1.5-pro",
+    model_name=model_name,
     generation_config=generation_config,
     safety_settings=safety_settings,
 )
 
+
+def create_cached_model(prefix, ttl):
+    cached_content = genai.caching.CachedContent.create(
+        model=model.model_name,
+        contents=list(prefix),
+        ttl=datetime.timedelta(seconds=ttl),
+    )
+    return genai.GenerativeModel.from_cached_content(
+        cached_content,
+        generation_config=generation_config,
+        safety_settings=safety_settings,
+    )
+
+
+if context_cache_ttl:
+    prompt_registry.enable_context_cache(create_cached_model, context_cache_ttl)
+
 themium_request_schema = {
     "type": "object",
     "properties": {"style": {"type": "string"}},
@@ -50,290 +108,632 @@ math_request_schema = {
 
 ask_request_schema = {
     "type": "object",
-    "properties": {"question": {"type": "string"}},
+    "properties": {"question": {"type": "string"}, "stream": {"type": "boolean"}},
     "required": ["question"],
 }
 
 teachme_request_schema = {
     "type": "object",
-    "properties": {"question": {"type": "string"}},
+    "properties": {"question": {"type": "string"}, "stream": {"type": "boolean"}},
     "required": ["question"],
 }
 
-limiter = Limiter(app, default_limits=["3 per minute"])
+batch_max_items = int(os.environ.get("BATCH_MAX_ITEMS", 16))
+batch_fields = {
+    "/api/themium/generate": "style",
+    "/api/geminium/math": "question",
+    "/api/geminium/ask": "question",
+    "/api/geminium/teachme": "question",
+}
+
+batch_request_schema = {
+    "type": "object",
+    "properties": {
+        "items": {
+            "type": "array",
+            "minItems": 1,
+            "maxItems": batch_max_items,
+            "items": {
+                "type": "object",
+                "properties": {
+                    "endpoint": {"enum": list(batch_fields)},
+                    "question": {"type": "string"},
+                    "style": {"type": "string"},
+                },
+                "required": ["endpoint"],
+                "allOf": [
+                    {
+                        "if": {"properties": {"endpoint": {"const": endpoint}}},
+                        "then": {"required": [field]},
+                    }
+                    for endpoint, field in batch_fields.items()
+                ],
+            },
+        },
+        "stream": {"type": "boolean"},
+    },
+    "required": ["items"],
+}
+
+# Compiled once so requests don't re-check the schemas themselves.
+themium_request_validator = Draft7Validator(themium_request_schema)
+math_request_validator = Draft7Validator(math_request_schema)
+ask_request_validator = Draft7Validator(ask_request_schema)
+teachme_request_validator = Draft7Validator(teachme_request_schema)
+batch_request_validator = Draft7Validator(batch_request_schema)
+
+rate_limited = registry.counter(
+    "geminium_rate_limited_total", "Requests rejected by the rate limiter."
+)
+blocked_requests = registry.counter(
+    "geminium_blocked_ip_total", "Requests rejected because the IP is blocked."
+)
+validation_errors = registry.counter(
+    "geminium_validation_errors_total", "Requests rejected by schema validation."
+)
+local_answers = registry.counter(
+    "geminium_local_answers_total", "Requests answered without calling the model."
+)
+invalid_themes = registry.counter(
+    "geminium_invalid_themes_total", "Model themes rejected by schema validation."
+)
+upstream_tokens = registry.counter(
+    "geminium_upstream_tokens_total", "Tokens billed by the model, by endpoint."
+)
+
+
+def on_rate_limited(request_limit):
+    rate_limited.inc(route=request.path, kind="requests")
 
-logs_file = "logs.json"
+
+# Counters live in a SQLite file so every worker on the host shares them.
+rate_limit_storage_uri = os.environ.get(
+    "RATELIMIT_STORAGE_URI", "sqlite:///ratelimits.db"
+)
+route_rate_limit = os.environ.get("ROUTE_RATE_LIMIT", "1 per second")
+authenticated_route_rate_limit = os.environ.get(
+    "AUTHENTICATED_ROUTE_RATE_LIMIT", "5 per second"
+)
+
+
+def is_authenticated():
+    if "authenticated" not in g:
+        token = request.headers.get("Authorization")
+        g.authenticated = bool(token and is_valid_token(token))
+    return g.authenticated
+
+
+def caller_key():
+    if is_authenticated():
+        token = request.headers["Authorization"]
+        return "token:" + hashlib.sha256(token.encode()).hexdigest()[:16]
+    return request.headers.get("cf-connecting-ip") or get_remote_address()
+
+
+def route_limit():
+    if is_authenticated():
+        return authenticated_route_rate_limit
+    return route_rate_limit
+
+
+# Batches are charged one hit per item against their own limit.
+batch_rate_limit = os.environ.get("BATCH_RATE_LIMIT", "30 per minute")
+authenticated_batch_rate_limit = os.environ.get(
+    "AUTHENTICATED_BATCH_RATE_LIMIT", "150 per minute"
+)
+
+
+def batch_limit():
+    if is_authenticated():
+        return authenticated_batch_rate_limit
+    return batch_rate_limit
+
+
+def batch_cost():
+    payload = request.get_json(silent=True)
+    items = payload.get("items") if isinstance(payload, dict) else None
+    return len(items) if isinstance(items, list) and items else 1
+
+
+limiter = Limiter(
+    caller_key,
+    app=app,
+    default_limits=["3 per minute"],
+    storage_uri=rate_limit_storage_uri,
+    strategy="sliding-window-counter",
+    on_breach=on_rate_limited,
+)
+
+token_quota = TokenQuota(
+    storage_from_string(rate_limit_storage_uri),
+    parse_limit(os.environ.get("TOKEN_QUOTA", "200000 per day")),
+    parse_limit(os.environ.get("AUTHENTICATED_TOKEN_QUOTA", "2000000 per day")),
+)
+
+upstream_timeout = float(os.environ.get("UPSTREAM_TIMEOUT", 60))
+upstream_limiter = UpstreamLimiter(
+    max_concurrency=int(os.environ.get("UPSTREAM_CONCURRENCY", 64)),
+    max_waiting=int(os.environ.get("UPSTREAM_QUEUE", 256)),
+    max_wait=float(os.environ.get("UPSTREAM_QUEUE_TIMEOUT", 10)),
+)
+in_flight = SingleFlight(max_wait=float(os.environ.get("COALESCE_MAX_WAIT", 90)))
+batch_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("BATCH_WORKERS", 32)),
+    thread_name_prefix="batch",
+)
+# Items waiting for or running on a batch worker, across all batches.
+batch_pending = PendingLimit(int(os.environ.get("BATCH_QUEUE", 256)))
+batch_queue_timeout = float(os.environ.get("BATCH_QUEUE_TIMEOUT", 10))
+
+logs_file = "logs.jsonl"
 tokens_file = "tokens.json"
+blocked_ips_file = "blockedips.json"
+
+blocked_ips = BlocklistStore(blocked_ips_file)
+tokens = TokenStore(tokens_file)
+reload_on_sighup(blocked_ips, tokens)
+
+# /ask and /teachme are left out so their answers stay fresh.
+response_cache = ResponseCache(
+    {
+        "/api/themium/generate": int(os.environ.get("THEMIUM_CACHE_TTL", 86400)),
+        "/api/geminium/math": int(os.environ.get("MATH_CACHE_TTL", 86400)),
+    },
+    max_entries=int(os.environ.get("RESPONSE_CACHE_SIZE", 1024)),
+    db_path=os.environ.get("RESPONSE_CACHE_DB"),
+)
 
 
+@timed("acl")
 def is_blocked_ip(ip):
-    with open("blockedips.json") as file:
-        blocked_ips = json.load(file)
-        return ip in blocked_ips
+    if ip in blocked_ips:
+        blocked_requests.inc(route=request.path)
+        return True
+    return False
 
 
+log_writer = LogWriter(logs_file)
+
+
+@timed("log")
 def log_request(ip, prompts, api_command):
-    logs = {}
-    if os.path.exists(logs_file):
-        with open(logs_file) as file:
-            logs = json.load(file)
+    log_writer.write(
+        {"ts": time.time(), "ip": ip, "command": api_command, "prompts": prompts}
+    )
+
+
+@timed("acl")
+def is_valid_token(token):
+    return token in tokens
+
+
+def record_usage(endpoint, response, caller, authenticated):
+    usage = response_usage(response)
+    for kind, count in usage.items():
+        upstream_tokens.inc(count, endpoint=endpoint, kind=kind)
+    token_quota.charge(caller, authenticated, usage.get("total_tokens", 0))
+
+
+def generate_content(template, user_input, generation_overrides=None):
+    caller, authenticated = caller_key(), is_authenticated()
+    # Checked per caller, not inside call(), so joining someone else's
+    # in-flight request never hands back their QuotaExceeded.
+    token_quota.check(caller, authenticated)
+
+    def call():
+        prompt_model, prompt_parts = template.prepare(user_input, model)
+        with upstream_limiter:
+            response = prompt_model.generate_content(
+                prompt_parts,
+                generation_config=generation_overrides,
+                request_options={"timeout": upstream_timeout},
+            )
+        record_usage(template.endpoint, response, caller, authenticated)
+        return response
+
+    # Identical requests already in flight share one upstream call.
+    key = (template.endpoint, normalize_prompt(user_input))
+    with stage("upstream"):
+        return in_flight.do(key, call)
+
+
+def stream_content(template, user_input):
+    caller, authenticated = caller_key(), is_authenticated()
+    token_quota.check(caller, authenticated)
+    prompt_model, prompt_parts = template.prepare(user_input, model)
+    # The slot is held until the stream finishes or the client goes away.
+    upstream_limiter.acquire()
+    try:
+        response = prompt_model.generate_content(
+            prompt_parts, stream=True, request_options={"timeout": upstream_timeout}
+        )
+    except BaseException:
+        upstream_limiter.release()
+        raise
+
+    def on_close(response):
+        upstream_limiter.release()
+        record_usage(template.endpoint, response, caller, authenticated)
+
+    return sse_response(response, on_close=on_close)
+
+
+class InvalidTheme(Exception):
+    def __init__(self):
+        super().__init__("The model returned an invalid theme")
+
+
+def answer_theme(user_style):
+    with stage("local"):
+        theme = themes.synthesize(user_style)
+    if theme is not None:
+        local_answers.inc(endpoint="/api/themium/generate")
+        return theme
+
+    with stage("cache"):
+        cached = response_cache.get("/api/themium/generate", user_style)
+    if cached is not None:
+        return cached
+
+    response = generate_content(
+        themium_prompt,
+        user_style,
+        generation_overrides={"response_mime_type": "application/json"},
+    )
+    theme = themes.parse_theme(response.text)
+    if theme is None:
+        invalid_themes.inc()
+        raise InvalidTheme()
+    response_cache.put("/api/themium/generate", user_style, theme)
+    return theme
+
+
+def answer_math(user_question):
+    with stage("local"):
+        answer = localmath.solve(user_question)
+    if answer is not None:
+        local_answers.inc(endpoint="/api/geminium/math")
+        return answer
+
+    with stage("cache"):
+        cached = response_cache.get("/api/geminium/math", user_question)
+    if cached is not None:
+        return cached
+
+    response = generate_content(math_prompt, user_question)
+    response_cache.put("/api/geminium/math", user_question, response.text)
+    return response.text
 
-    if ip not in logs:
-        logs[ip] = {}
 
-    if api_command not in logs[ip]:
-        logs[ip][api_command] = []
+def answer_ask(user_question):
+    response = generate_content(ask_prompt, user_question)
+    return response.parts[0].text
 
-    logs[ip][api_command].extend(prompts)
 
-    with open(logs_file, "w") as file:
-        json.dump(logs, file, indent=2)
+def answer_teachme(user_question):
+    response = generate_content(teachme_prompt, user_question)
+    return response.parts[0].text
 
 
-def is_valid_token(token):
-    with open(tokens_file) as file:
-        tokens = json.load(file)
-        return token in tokens
+batch_handlers = {
+    "/api/themium/generate": answer_theme,
+    "/api/geminium/math": answer_math,
+    "/api/geminium/ask": answer_ask,
+    "/api/geminium/teachme": answer_teachme,
+}
+
+
+@app.errorhandler(InvalidTheme)
+def invalid_theme(e):
+    return jsonify({"error": str(e)}), 502
+
+
+@app.errorhandler(UpstreamBusy)
+def upstream_busy(e):
+    response = jsonify({"error": str(e)})
+    response.headers["Retry-After"] = str(e.retry_after)
+    return response, 503
+
+
+@app.errorhandler(QuotaExceeded)
+def quota_exceeded(e):
+    rate_limited.inc(route=request.path, kind="tokens")
+    response = jsonify({"error": str(e)})
+    response.headers["Retry-After"] = str(e.retry_after)
+    return response, 429
+
+
+@app.errorhandler(DeadlineExceeded)
+@app.errorhandler(TimeoutError)
+def upstream_timed_out(e):
+    return jsonify({"error": "The model took too long to respond"}), 504
+
+
+slow_request_seconds = float(os.environ.get("SLOW_REQUEST_SECONDS", 0))
+slow_request_log = logging.getLogger("geminium.slow_requests")
+
+
+@app.before_request
+def start_timer():
+    g.started = time.perf_counter()
+    g.route = request.url_rule.rule if request.url_rule else "unmatched"
+    g.stages = {}
+
+
+@app.after_request
+def record_timing(response):
+    if "started" not in g:
+        return response
+    elapsed = time.perf_counter() - g.started
+    request_seconds.observe(elapsed, route=g.route, status=response.status_code)
+    if slow_request_seconds and elapsed >= slow_request_seconds:
+        slow_request_log.warning(
+            json.dumps(
+                {
+                    "route": g.route,
+                    "status": response.status_code,
+                    "seconds": round(elapsed, 6),
+                    "stages": {k: round(v, 6) for k, v in g.stages.items()},
+                }
+            )
+        )
+    return response
+
+
+registry.collected(
+    "geminium_response_cache_total",
+    "Response cache lookups by result.",
+    lambda: [
+        ({"result": "hit"}, response_cache.hits),
+        ({"result": "miss"}, response_cache.misses),
+    ],
+    type="counter",
+)
+registry.collected(
+    "geminium_coalesced_requests_total",
+    "Requests that shared an identical in-flight upstream call.",
+    lambda: [({}, in_flight.coalesced)],
+    type="counter",
+)
+registry.collected(
+    "geminium_upstream_in_flight",
+    "Upstream calls running and waiting for a slot.",
+    lambda: [
+        ({"state": "active"}, upstream_limiter.active),
+        ({"state": "waiting"}, upstream_limiter.waiting),
+    ],
+)
+registry.collected(
+    "geminium_upstream_rejected_total",
+    "Requests shed because the upstream queue was full.",
+    lambda: [({}, upstream_limiter.rejected)],
+    type="counter",
+)
+registry.collected(
+    "geminium_batch_items_pending",
+    "Batch items waiting for or running on a batch worker.",
+    lambda: [({}, batch_pending.pending)],
+)
+registry.collected(
+    "geminium_batch_rejected_total",
+    "Batches shed because too many items were already pending.",
+    lambda: [({}, batch_pending.rejected)],
+    type="counter",
+)
+registry.collected(
+    "geminium_log_dropped_total",
+    "Log records dropped because the writer queue was full.",
+    lambda: [({}, log_writer.dropped)],
+    type="counter",
+)
+
+registry.collected(
+    "geminium_prompt_tokens_saved_total",
+    "Prefix tokens not sent because the prompt was cached upstream.",
+    lambda: [
+        ({"endpoint": endpoint}, row["tokens_saved"])
+        for endpoint, row in prompt_registry.report().items()
+    ],
+    type="counter",
+)
+
+
+@app.route("/metrics")
+@limiter.exempt
+def metrics():
+    return Response(registry.render(), mimetype="text/plain; version=0.0.4")
 
 
 @app.route("/api/themium/generate", methods=["POST"])
-@limiter.limit("1 per second")
+@limiter.limit(route_limit)
 def generate_theme():
     ip = request.headers.get("cf-connecting-ip")
     if is_blocked_ip(ip):
         return jsonify({"error": "Your IP has been blocked"}), 403
-    prompts = []
     try:
         # Validate the JSON payload against the schema
-        validate(request.json, themium_request_schema)
+        with stage("validate"):
+            themium_request_validator.validate(request.json)
     except ValidationError as e:
+        validation_errors.inc(route=request.path)
         return jsonify({"error": str(e)}), 400
 
-    token = request.headers.get("Authorization")
-    if token and is_valid_token(token):
-        prompts = []
-    else:
-        log_request(ip, prompts, "/api/geminium/ask")
-
     user_style = request.json["style"]
-    prompts.append(user_style)
-
-    themium_prompt_parts = [
-        'You create themes for Meower. Do not change any of the variable names, only their values! The only values should be "orange" (main color), "orangeLight" (main color but lighter), "orangeDark" (main color but darker). "background" (the background color), "foreground" (mainly used for text and a few other things), "foregroundOrange" (used for outlines of buttons) and "tinting" (used for tinting).Here are some basic color examples you can use:Red - #FF0000Orange - #FFA500Meower Orange - #FC5D11Yellow - #FFFF00Green - #008000Lime - #32CD32Mint Green - #98FB98Blue Green - #0D98BACobalt Blue - #0047ABToothpaste Blue - #B1EAE8Cyan - #00FFFFBlue - #0000FFTeal - #008080Blue Purple - #8A2BE2Indigo - #4B0082Purple - #800080Violet - #7F00FFPink - #FFC0CBBlack - #000000Grey - #808080White - #FFFFFF\n\nDo not respond with a codeblock.',
-        "input: The default orange theme",
-        'output: {"v":1,"orange":"#f9a636","orangeLight":"#ffcb5b","orangeDark":"#d48111","background":"#ffffff","foreground":"#000000","foregroundOrange":"#ffffff","tinting":"#252525"}',
-        "input: The default orange theme but turqouise",
-        'output: {"v":1,"orange":"#2ec4b6","background":"#ffffff","foreground":"#000000","foregroundOrange":"#ffffff","tinting":"#252525","orangeLight":"#53e9db","orangeDark":"#099f91"}',
-        "input: A red theme with dark mode",
-        'output: {"v":1,"orange":"#e62739","orangeLight":"#ff6974","orangeDark":"#bf001d","background":"#181818","foreground":"#ffffff","foregroundOrange":"#ffffff","tinting":"#252525"}',
-        "input: A dark mode green theme",
-        'output: {"v":1,"orange":"#28b485","orangeLight":"#52d8a8","orangeDark":"#008e60","background":"#181818","foreground":"#ffffff","foregroundOrange":"#ffffff","tinting":"#252525"}',
-        "input: Android holo ui colours with dark background and blue accents",
-        'output: {"v":1,"orange":"#0099cc","background":"#090909","foreground":"#ffffff","foregroundOrange":"#C5EAF8","tinting":"#001820","orangeLight":"#00b1ec","orangeDark":"#0081ac"}',
-        "input: A dark mint-green theme with dark-green tinting",
-        'output: {"v":1,"orange":"#2e8b57","orangeLight":"#64d88d","orangeDark":"#00693e","background":"#181818","foreground":"#ffffff","foregroundOrange":"#ffffff","tinting":"#00301b"}',
-        "input: Light caramel colored background and and main color with white tinting",
-        'output: {"v":1,"orange":"#c39f81","orangeLight":"#f6d7b8","orangeDark":"#97755d","background":"#f6d7b8","foreground":"#000000","foregroundOrange":"#000000","tinting":"#ffffff"}',
-        "input: A pitch black AMOLED theme with cool cyan accents",
-        'output: {"v":1,"orange":"#00bfff","orangeLight":"#33e0ff","orangeDark":"#008cba","background":"#000000","foreground":"#ffffff","foregroundOrange":"#ffffff","tinting":"#00171f"}',
-        "input: A theme based on the colors of the Google Turtle Emoji",
-        'output: {"v":1,"orange":"#66bb6a","orangeLight":"#99d98c","orangeDark":"#339933","background":"#001820","foreground":"#ffffff","foregroundOrange":"#ffffff","tinting":"#00301b"}',
-        'input: Make this theme light mode: {"v":1,"orange":"#ffffff","orangeLight":"#ffffff","orangeDark":"#ffffff","background":"#000000","foreground":"#ffffff","foregroundOrange":"#000000","tinting":"#000000"}',
-        'output: {"v":1,"orange":"#8bc34a","background":"#deffb7","foreground":"#000000","foregroundOrange":"#ffffff","tinting":"#030402","orangeLight":"#8ec74c","orangeDark":"#88bf48"}',
-        'input: Make this theme light mode: {"v":1,"orange":"#ffeb3b","orangeLight":"#ffff72","orangeDark":"#c8b91d","background":"#1d2951","foreground":"#ffffff","foregroundOrange":"#ffffff","tinting":"#374785"}',
-        'output: {"v":1,"orange":"#ffeb3b","orangeLight":"#ffff72","orangeDark":"#c8b91d","background":"#1d2951","foreground":"#ffffff","foregroundOrange":"#ffffff","tinting":"#374785"}',
-        'input: Make this theme light mode: {"v":1,"orange":"#00bfff","orangeLight":"#33e0ff","orangeDark":"#008cba","background":"#000000","foreground":"#ffffff","foregroundOrange":"#ffffff","tinting":"#00171f"}',
-        'output: {"v":1,"orange":"#00bfff","orangeLight":"#00d6ff","orangeDark":"#00a8e0","background":"#ffffff","foreground":"#000000","foregroundOrange":"#ffffff","tinting":"#00171f"}',
-        'input: Make this theme dark mode: {"v":1,"orange":"#fc747b","orangeLight":"#ff8a8f","orangeDark":"#de5e64","background":"#ffffff","foreground":"#000000","foregroundOrange":"#ffffff","tinting":"#252525"}',
-        'output: {"v":1,"orange":"#fc747b","orangeLight":"#ff99a0","orangeDark":"#d74f56","background":"#1c1c1c","foreground":"#ffffff","foregroundOrange":"#ffffff","tinting":"#252525"}',
-        'input: Make this theme dark mode: {"v":1,"orange":"#57ab4b","orangeLight":"#88c971","orangeDark":"#2b802c","background":"#ffffff","foreground":"#000000","foregroundOrange":"#ffffff","tinting":"#252525"}',
-        'output: {"v":1,"orange":"#57ab4b","orangeLight":"#7cd070","orangeDark":"#328626","background":"#171717","foreground":"#ffffff","foregroundOrange":"#ffffff","tinting":"#252525"}',
-        'input: Make this theme dark mode: {"v":1,"orange":"#00bfff","background":"#ffffff","foreground":"#000000","foregroundOrange":"#ffffff","tinting":"#003e5c","orangeLight":"#33e0ff","orangeDark":"#008cba"}',
-        'output: {"v":1,"orange":"#00bfff","background":"#000000","foreground":"#ffffff","foregroundOrange":"#ffffff","tinting":"#003e5c","orangeLight":"#00fdff","orangeDark":"#0081a3"}',
-        "input: ",
-        "output: ",
-    ]
-    themium_prompt_parts.append(f"{user_style}")
-
-    response = model.generate_content(themium_prompt_parts)
-    return response.text
+
+    log_request(ip, [user_style], "/api/themium/generate")
+
+    return answer_theme(user_style)
 
 
 @app.route("/api/geminium/math", methods=["POST"])
-@limiter.limit("1 per second")
+@limiter.limit(route_limit)
 def solve_math():
     ip = request.headers.get("cf-connecting-ip")
     if is_blocked_ip(ip):
         return jsonify({"error": "Your IP has been blocked"}), 403
-    prompts = []
     try:
         # Validate the JSON payload against the schema
-        validate(request.json, math_request_schema)
+        with stage("validate"):
+            math_request_validator.validate(request.json)
     except ValidationError as e:
+        validation_errors.inc(route=request.path)
         return jsonify({"error": str(e)}), 400
 
-    token = request.headers.get("Authorization")
-    if token and is_valid_token(token):
-        prompts = []
-    else:
-        log_request(ip, prompts, "/api/geminium/ask")
-
     user_question = request.json["question"]
-    prompts.append(user_question)
 
     log_request(ip, [user_question], "/api/geminium/math")
 
-    math_prompt_parts = [
-        "You're now the Geminium Math AI model. When given a math question, show the steps to solve the question and highlight the final answer in bold text (with markdown).",
-        "input: 23 + 4 / 5",
-        "output: **Question:** 23 + 4 / 5\n\n**Step 1:** Perform the division operation first: 4 / 5 = 0.8\n\n**Step 2:** Add the result of the division to the remaining number: 23 + 0.8 = 23.8\n\n**Answer: 23.8**",
-        "input: 55% of 98.3",
-        "output: **Question:** 55% of 98.3\n\n**Step 1:** Convert 55% to decimal form: 55% = 55/100 = 0.55\n\n**Step 2:** Multiply the decimal form of the percentage by the number: 0.55 * 98.3 = 53.665\n\n**Answer: 53.665**",
-        "input: 2 + 1",
-        "output: **Question:** 2 + 1\n\n**Step 1:** Add the two numbers: 2 + 1 = 3\n\n**Answer: 3**",
-        "input: 98 billion 320 million 22 thousand 3 hundred and 44 as a number",
-        "output: **Question:** 98 billion 320 million 22 thousand 3 hundred and 44 as a number\n\n**Answer: 98,320,022,344**",
-        "input: Is 23 a prime number?",
-        "output: **Question:** Is 23 a prime number?\n\n**Answer: Yes**",
-        "input: ",
-        "output: ",
-    ]
-    math_prompt_parts.append(f"{user_question}")
-
-    response = model.generate_content(math_prompt_parts)
-    return response.text
+    return answer_math(user_question)
 
 
 @app.route("/api/geminium/ask", methods=["POST"])
-@limiter.limit("1 per second")
+@limiter.limit(route_limit)
 def ask_question():
     ip = request.headers.get("cf-connecting-ip")
     if is_blocked_ip(ip):
         return jsonify({"error": "Your IP has been blocked"}), 403
-    prompts = []
     try:
         # Validate the JSON payload against the schema
-        validate(request.json, ask_request_schema)
+        with stage("validate"):
+            ask_request_validator.validate(request.json)
     except ValidationError as e:
+        validation_errors.inc(route=request.path)
         return jsonify({"error": str(e)}), 400
 
-    token = request.headers.get("Authorization")
-    if token and is_valid_token(token):
-        prompts = []
-    else:
-        log_request(ip, prompts, "/api/geminium/ask")
-
     user_question = request.json["question"]
-    prompts.append(user_question)
 
     log_request(ip, [user_question], "/api/geminium/ask")
 
-    ask_prompt_parts = [
-        "You're Geminium Ask, an AI model designed to answer questions with short but informative replies. You can't receive replies or additional context, only receive the question and answer the question. Respond using markdown.",
-        "input: Who was the 43rd president of the United States?",
-        "output: The 43rd president of the United States was **George W. Bush**. He was president from the **20th of January 2001** to to the **20th of January 2009**.",
-        "input: When was the first Google Pixel released? What colours did it come in?",
-        "output: The first Google Pixel was released on October 20, 2016. It came in three colors: Quite Black, Really Blue, and Very Silver.",
-        "input: What were the specs of the first iPhone?",
-        "output: * 3.5-inch TFT touchscreen display with a resolution of 320x480 pixels\n* 2-megapixel rear camera with fixed focus and no flash\n* VGA front-facing camera\n* 4GB or 8GB of storage\n* 128MB of RAM\n* 412MHz ARM 1176JZ-F processor\n* Wi-Fi (802.11b/g), Bluetooth 2.0, and EDGE connectivity\n* 1,400mAh lithium-ion battery",
-        "input: How many bananas have been sold in Australia?",
-        "output: It is impossible to provide an accurate answer to this question, as there is no publicly available data on the total number of bananas sold in Australia.",
-        "input: What's 21 + 89?",
-        "output: 110",
-        "input: What is the combined voltage of 3 standard alkaline AA batteries?",
-        "output: 4.5 volts",
-        "input: Can you power a normal Red LED with an AAA battery?",
-        "output: Yes, you can power a normal Red LED with an AAA battery. A standard AAA battery provides 1.5 volts of power, which is enough to power a normal Red LED, which typically requires around 2 volts to operate.",
-        "input: How many iPhone 3G's worth of battery capacity is in a Google Pixel 6 Pro?",
-        "output: The Google Pixel 6 Pro has a battery capacity of 5,003mAh, while the iPhone 3G has a battery capacity of 1,150mAh. Therefore, the Google Pixel 6 Pro has a battery capacity of approximately 4.35 iPhone 3Gs.",
-        "input: What is the highest recorded gas price in history and where was it?",
-        "output: The highest recorded gas price in history was **$10.77 per gallon**, in **Humboldt, California, United States** on June 14, 2022.",
-        "input: When is your data training cutoff?",
-        "output: My training cutoff is **April 2023**. This means that I do not have access to real-time information or data past this date.",
-        "input: What is the most used emoji as of 2021?",
-        'output: The most used emoji as of 2021 was **"Tears of Joy"** 😂.',
-        "input: How many users does Reddit have in 2022 as compared to 2012?",
-        "output: In 2022, Reddit had **430 million** active users, compared to **130 million** active users in 2012. This represents an increase of **230 million** active users.",
-        "input: What is Meower?",
-        "output: Meower is a **social media platform** created by jaxonbaxon in 2020 and currently owned by MikeDEV. As of 26 January 2024, Meower has about 6000 users.",
-        "input: What is the Meower website?",
-        "output: The official Meower website is **https://meower.org**.",
-        "input: How can I use Meower?",
-        "output: You can access Meower using the **official client** at https://app.meower.org, or by using a **third party client** created by members of the community. Examples of these include [Roarer](https://mybearworld.github.io/roarer/) and [meo](https://meo-32r.pages.dev).",
-        "input: What is Meower's official client made with?",
-        "output: Meower's official client is made using **Svelte** and is deployed using **Cloudflare Pages**",
-        "input: How can users interact on Meower?",
-        "output: Users on Meower can interact in **home, livechat, group chats and DMs** using **posts, images and emojis**.",
-        "input: How did Meower start?",
-        "output: Meower started life as a Scratch 3.0-based social media platform. With the\ncontinuous support of our amazing community, Meower has evolved into a feature-rich platform for creators of all\nkinds.",
-        "input: Is Meower open-source?",
-        "output: **Yes!** Meower is open source and the source code is available on [GitHub](https://github.com/meower-media-co).",
-        "input: Where is Meower's Terms of Sevrice/Privacy Policy?",
-        "output: Meower's terms of service and privacy policy can be viewed **[here](https://meower.org/legal)**.",
-        "input: What is Meower's official mascot?",
-        "output: Meower's official mascot is **Meowy**! Meowy can be found around the Meower client, website, GitHub and community projects. [Picture of Meowy: https://meower.org/icons/meowyicon.svg]",
-        "input: Who hosts Meower?",
-        "output: Meower's servers are hosted by **MikeDEV**. Some other services however such as the **Meower Forums** are hosted by **tnix**.",
-        "input: What is Roarer Glass?",
-        "output: Roarer Glass is a **userscript for Roarer** that gives it a translucent glass-like effect with custom background support and **allows for customisation** of other UI elements. You can download it from **[Greasy Fork](https://greasyfork.org/en/scripts/485804-roarer-glass)** to a userscript manager such as **Tampermonkey** or **Violentmonkey**.",
-        "input: ",
-        "output: ",
-    ]
-    ask_prompt_parts.append(f"{user_question}")
-
-    response = model.generate_content(ask_prompt_parts)
-    return response.parts[0].text
+    if wants_stream(request):
+        return stream_content(ask_prompt, user_question)
+
+    return answer_ask(user_question)
 
 
 @app.route("/api/geminium/teachme", methods=["POST"])
-@limiter.limit("1 per second")
+@limiter.limit(route_limit)
 def teachme_question():
     ip = request.headers.get("cf-connecting-ip")
     if is_blocked_ip(ip):
         return jsonify({"error": "Your IP has been blocked"}), 403
-    prompts = []
     try:
         # Validate the JSON payload against the schema
-        validate(request.json, teachme_request_schema)
+        with stage("validate"):
+            teachme_request_validator.validate(request.json)
     except ValidationError as e:
+        validation_errors.inc(route=request.path)
         return jsonify({"error": str(e)}), 400
 
-    token = request.headers.get("Authorization")
-    if token and is_valid_token(token):
-        prompts = []
-    else:
-        log_request(ip, prompts, "/api/geminium/teachme")
-
     user_question = request.json["question"]
-    prompts.append(user_question)
 
     log_request(ip, [user_question], "/api/geminium/teachme")
 
-    teachme_prompt_parts = [
-        "You're Geminium Teachme (or just Geminium for short), an AI \nmodel designed to take a lession subject and teach the user about that subject with up to 3 detailed paragraphs. \nYou can't receive replies or additional context, only receive the \nquestion and answer the question. Respond using markdown. You have a character limit of 2000 characters",
-        "input: sometimes when I pet my cat his fur is really smooth and soft when he \nwants food while other times his fur feels rougher like when he’s trying\n to sleep, why is this?",
-        "output: Cats have two types of fur: **guard hairs** and **down hairs**. Guard hairs are the longer, coarser hairs that make up the outer layer of the fur. Down hairs are the shorter, finer hairs that make up the undercoat.\n\nWhen your cat is **relaxed and content**, the **guard hairs lie flat against the body**, and the **down hairs** are **fluffed up** to **create a layer of insulation. This makes the fur feel soft and smooth.**\n\nWhen your cat is **excited or stressed**, the **guard hairs stand up on end**, and the **down hairs are pulled in closer to the body**. This makes the fur feel rougher and more wiry.\n\nIn addition to the physical changes in the fur, there are also changes in the **oils that the skin produces**. When your cat is relaxed, the skin produces more oils, which makes the fur feel softer and shinier. When your cat is **stressed, the skin produces less oils**, which makes the fur feel drier and rougher.\n\nSo, the next time you pet your cat, pay attention to how their fur feels. It can tell you a lot about their mood and state of mind.",
-        "input: why did jack dorsey create twitter?",
-        'output: Jack Dorsey created Twitter in 2006 as a way for people to **share short messages** with each other. He was inspired by the idea of a "status update," which was a popular feature on AOL Instant Messenger at the time. Dorsey believed that a service that allowed people to share short updates about their lives would be a **valuable tool for communication and connection**.\n\nDorsey also wanted to create a platform that was easy to use and accessible to everyone. **He chose the name "Twitter" because it was short, easy to remember**, and evoked the idea of chirping birds. He also designed the platform to be **simple and straightforward**, with a focus on brevity and real-time communication.\n\nTwitter quickly gained popularity, and **by 2007, it had over 500,000 users**. In 2009, Twitter introduced hashtags, which made it easier for users to find and follow conversations about specific topics. This feature helped Twitter become even more popular, and by 2010, it had over 100 million users.\n\n**Today, Twitter is one of the most popular social media platforms in the world**, with **over 330 million monthly active users**. It is used by people from all walks of life to share news, information, and opinions. Twitter has also become a powerful tool for businesses and organizations to connect with customers and promote their products and services.',
-        "input: How do penguins survive such harsh weather conditions?",
-        "output: Penguins have a number of adaptations that help them survive in harsh weather conditions:\n\n* **Thick layer of fat:** Penguins have a thick layer of fat that insulates them from the cold. This layer of fat can be up to 2 inches thick, and it helps to keep the penguin's core temperature warm, even when the air temperature is below freezing.\n* **Feathers:** Penguins also have a dense layer of feathers that helps to trap heat and keep the penguin dry. Penguin feathers are also waterproof, which helps to protect the penguin from the cold water and snow.\n* **Flippers:** Penguins' flippers are not only used for swimming, but they also help to keep the penguin warm. Penguins can tuck their flippers into their bodies to conserve heat, and they can also use their flippers to cover their feet, which are one of the most vulnerable parts of their body to the cold.\n* **Behavioral adaptations:** Penguins also have a number of behavioral adaptations that help them to survive in harsh weather conditions. For example, penguins often huddle together in large groups to conserve heat. They will also take turns swimming and resting, so that each penguin can get a chance to warm up.\n\nThese are just a few of the adaptations that help penguins to survive in harsh weather conditions. These adaptations allow penguins to live in some of the coldest and most inhospitable environments on Earth.",
-        "input: What is the story behind the creation of Apple Inc?",
-        "output: **In 1976, two friends, Steve Jobs and Steve Wozniak, built a personal computer in Jobs' garage**. They called it the **Apple I**, and it was the first personal computer to be sold fully assembled. The Apple I was a success, and Jobs and Wozniak **founded Apple Computer, Inc. in 1977**.\n\nThe following year, Apple released the **Apple II**, which was an even bigger success than the Apple I. The Apple II was one of **the first personal computers to be sold with a color monitor**, and it quickly became the **most popular personal computer in the world**.\n\n**In 1980, Apple went public**, and Jobs became a multimillionaire. However, he was forced to resign from Apple in 1985 after a power struggle with the company's board of directors.\n\nJobs went on to found NeXT, a computer company that was not as successful as Apple. However, in 1997, Apple bought NeXT, and **Jobs returned to Apple as its CEO**.\n\nUnder Jobs' leadership, Apple released a number of **successful products, including the iMac, the iPod, the iPhone, and the iPad**. Apple became one of the most valuable companies in the world, and Jobs became one of the most iconic figures in the tech industry.\n\n**Jobs died in 2011**, but Apple continues to be a successful company. It is now the most valuable company in the world, and its products are used by people all over the globe.",
-        "input: How did Tokyo make earthquake-proof buildings?",
-        "output: Tokyo has a long history of earthquakes, and its buildings are designed to withstand them. Here are some of the ways that Tokyo's buildings are made earthquake-proof:\n\n* **Base isolation:** Many buildings in Tokyo are built on **base isolators**, which are devices that absorb seismic energy and reduce the amount of shaking that the building experiences. Base isolators are typically made of rubber or steel, and they are placed between the foundation of the building and the ground.\n* **Damping systems:** Damping systems are devices that dissipate seismic energy and reduce the vibrations of a building. There are many different types of damping systems, but they all work by converting the energy of the earthquake into heat or other forms of energy.\n* **Structural design:** The structural design of a building can also help to make it earthquake-proof. Buildings that are designed to be flexible and resilient are more likely to withstand an earthquake without collapsing.\n* **Materials:** The materials that are used to construct a building can also affect its earthquake resistance. Buildings that are made of reinforced concrete or steel are more likely to withstand an earthquake than buildings that are made of weaker materials, such as wood or brick.\n\n**Building codes:** Tokyo has strict building codes that require all new buildings to be designed to withstand earthquakes. These codes specify the types of materials that can be used, the structural design of the building, and the types of earthquake-proofing systems that must be installed.\n\nAs a result of these measures, Tokyo's buildings are some of the most earthquake-proof in the world. Even during the Great East Japan Earthquake of 2011, which was one of the most powerful earthquakes ever recorded, Tokyo's buildings suffered relatively little damage.",
-        "input: Why is there a giant barcode-like thing in the middle of the Mojave Desert?",
-        "output: The giant barcode-like thing in the middle of the Mojave Desert is called **Desert Sunlight**. It is a **solar power plant** that was built in 2014. The plant consists of **93,000 mirrors** that focus sunlight onto a **central tower**. The heat from the sunlight is then used to **generate electricity**.\n\nDesert Sunlight is a **concentrated solar power (CSP)** plant. CSP plants use mirrors or lenses to concentrate sunlight onto a small area, which creates heat. The heat is then used to boil water and generate steam, which drives a turbine to generate electricity.\n\nCSP plants are more efficient than traditional solar panels, which convert sunlight directly into electricity. However, CSP plants are also more expensive to build and maintain.\n\nDesert Sunlight is one of the largest CSP plants in the world. It has a capacity of **550 megawatts**, which is enough to power **150,000 homes**. The plant is owned and operated by **NextEra Energy Resources**.\n\nDesert Sunlight is a significant step forward in the development of solar power. It shows that CSP plants can be built on a large scale and that they can generate a significant amount of electricity.",
-        "input: Why does China own almost every panda in the world?",
-        "output: China owns almost every panda in the world because **pandas are native to China**, and **the Chinese government has strict laws protecting them**. Pandas are considered a **national treasure**, and it is illegal to hunt, kill, or capture them without a permit.\n\nIn addition, the Chinese government has been working to **repopulate the panda population**, which was once very low. In the 1980s, there were only about 1,000 pandas left in the wild. Today, there are over 2,000 pandas in the wild, and over 600 pandas in captivity.\n\nThe Chinese government has also been working to **promote pandas as a symbol of China**. Pandas are featured on Chinese currency, stamps, and other items. They are also popular tourist attractions, and the Chinese government has been working to increase tourism to panda reserves.\n\nAs a result of these efforts, China now owns almost every panda in the world. This has helped to protect the panda population and promote pandas as a symbol of China.",
-        "input: What's the story of Meower?",
-        "output: Sorry, I don't have any info on Meower yet, but Geminium Ask does if you want to ask any short question about Meower.",
-        "input: ",
-        "output: ",
-    ]
-    teachme_prompt_parts.append(f"{user_question}")
-
-    response = model.generate_content(teachme_prompt_parts)
-    return response.parts[0].text
+    if wants_stream(request):
+        return stream_content(teachme_prompt, user_question)
+
+    return answer_teachme(user_question)
+
+
+def batch_error(e):
+    if isinstance(e, QuotaExceeded):
+        rate_limited.inc(route="/api/geminium/batch", kind="tokens")
+        return 429, str(e)
+    if isinstance(e, UpstreamBusy):
+        return 503, str(e)
+    if isinstance(e, InvalidTheme):
+        return 502, str(e)
+    if isinstance(e, (DeadlineExceeded, TimeoutError)):
+        return 504, "The model took too long to respond"
+    app.logger.error("Batch item failed", exc_info=e)
+    return 500, "Internal server error"
+
+
+def run_batch_item(index, item, authenticated, submitted):
+    # Runs on a batch worker with a copy of the request context, whose g is
+    # fresh; the stage timings are handed back for the batch's own g.
+    g.route, g.authenticated = request.url_rule.rule, authenticated
+    g.stages = {}
+    endpoint = item["endpoint"]
+    result = {"index": index, "endpoint": endpoint, "status": 200}
+    try:
+        if time.monotonic() - submitted > batch_queue_timeout:
+            raise UpstreamBusy(batch_pending.retry_after)
+        result["result"] = batch_handlers[endpoint](item[batch_fields[endpoint]])
+    except Exception as e:
+        result["status"], result["error"] = batch_error(e)
+    return result, g.stages
+
+
+def stream_batch(futures):
+    try:
+        for future in as_completed(futures):
+            result, _ = future.result()
+            yield sse_event(result, event="result")
+        yield sse_event({"count": len(futures)}, event="done")
+    finally:
+        # Items that haven't started are dropped if the client goes away.
+        for future in futures:
+            future.cancel()
+
+
+@app.route("/api/geminium/batch", methods=["POST"])
+@limiter.limit(batch_limit, cost=batch_cost)
+def batch():
+    ip = request.headers.get("cf-connecting-ip")
+    if is_blocked_ip(ip):
+        return jsonify({"error": "Your IP has been blocked"}), 403
+    try:
+        # Validate the JSON payload against the schema
+        with stage("validate"):
+            batch_request_validator.validate(request.json)
+    except ValidationError as e:
+        validation_errors.inc(route=request.path)
+        return jsonify({"error": str(e)}), 400
+
+    items = request.json["items"]
+
+    # One record per endpoint, under that endpoint's command, so the log
+    # view files batched prompts with the ones sent to each route directly.
+    prompts = {}
+    for item in items:
+        endpoint = item["endpoint"]
+        prompts.setdefault(endpoint, []).append(item[batch_fields[endpoint]])
+    for endpoint, endpoint_prompts in prompts.items():
+        log_request(ip, endpoint_prompts, endpoint)
+
+    authenticated = is_authenticated()
+    # Raises UpstreamBusy (503 with Retry-After) when the pool is backed up.
+    batch_pending.reserve(len(items))
+    submitted = time.monotonic()
+    futures = []
+    for index, item in enumerate(items):
+        future = batch_executor.submit(
+            copy_current_request_context(run_batch_item),
+            index,
+            item,
+            authenticated,
+            submitted,
+        )
+        # Also runs for items cancelled before they started.
+        future.add_done_callback(lambda future: batch_pending.release())
+        futures.append(future)
+
+    if wants_stream(request):
+        return Response(
+            stream_batch(futures),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    results = []
+    with stage("batch"):
+        for future in futures:
+            result, stages = future.result()
+            results.append(result)
+            # Summed across items, which ran in parallel.
+            for name, seconds in stages.items():
+                g.stages[f"items.{name}"] = g.stages.get(f"items.{name}", 0.0) + seconds
+    return jsonify({"results": results})
 
 
 if __name__ == "__main__":
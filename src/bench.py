@@ -0,0 +1,209 @@
+"""Benchmark the API against a local fake model.
+
+    python bench.py --concurrency 32 --requests 400 --latency lognormal:1.5:0.4
+
+Every route is driven in-process through Flask's test client with the
+upstream model swapped for fakemodel.FakeModel. The JSON report has latency
+percentiles, throughput and server-side overhead (wall time minus time
+spent in the fake upstream) per route.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import fakemodel
+
+ROUTES = {
+    "generate": ("/api/themium/generate", "style"),
+    "math": ("/api/geminium/math", "question"),
+    "ask": ("/api/geminium/ask", "question"),
+    "teachme": ("/api/geminium/teachme", "question"),
+}
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(values):
+    return {
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "mean": statistics.fmean(values) if values else None,
+        "max": max(values) if values else None,
+    }
+
+
+def prepare_workdir(workdir, blocked_ips, tokens, log_records):
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    with open("blockedips.json", "w") as file:
+        json.dump(
+            [
+                f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}"
+                for i in range(blocked_ips)
+            ],
+            file,
+        )
+    with open("tokens.json", "w") as file:
+        json.dump([f"token-{i}" for i in range(tokens)], file)
+    if log_records:
+        with open("logs.jsonl", "w") as file:
+            for i in range(log_records):
+                record = {
+                    "ts": time.time(),
+                    "ip": f"192.0.2.{i % 256}",
+                    "command": "/api/geminium/ask",
+                    "prompts": [f"seeded question {i}"],
+                }
+                file.write(json.dumps(record) + "\n")
+
+
+def run_route(api, name, args):
+    path, field = ROUTES[name]
+    counter = itertools.count()
+    headers = {"cf-connecting-ip": "198.51.100.7"}
+    if args.stream and name in ("ask", "teachme"):
+        headers["Accept"] = "text/event-stream"
+
+    def one(_):
+        # Unique prompts unless asked otherwise, so the cache and request
+        # coalescing don't hide the cost being measured.
+        number = next(counter)
+        prompt = "What is 2 + 2?" if args.repeat else f"bench question {number}"
+        client = api.app.test_client()
+        fakemodel.reset_upstream_seconds()
+        start = time.perf_counter()
+        response = client.post(path, json={field: prompt}, headers=headers)
+        response.get_data()
+        elapsed = time.perf_counter() - start
+        return response.status_code, elapsed, fakemodel.upstream_seconds()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        results = list(pool.map(one, range(args.requests)))
+    wall = time.perf_counter() - started
+
+    statuses = {}
+    for status, _, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    ok = [result for result in results if result[0] == 200]
+    return {
+        "path": path,
+        "requests": len(results),
+        "errors": len(results) - len(ok),
+        "status_counts": statuses,
+        "requests_per_second": len(results) / wall if wall else None,
+        "latency_ms": summarize([elapsed * 1000 for _, elapsed, _ in ok]),
+        "overhead_ms": summarize(
+            [(elapsed - upstream) * 1000 for _, elapsed, upstream in ok]
+        ),
+    }
+
+
+def regressions(report, baseline, tolerance):
+    found = []
+    for name, route in report["routes"].items():
+        before = baseline.get("routes", {}).get(name)
+        if not before:
+            continue
+        for metric in ("latency_ms", "overhead_ms"):
+            old, new = before[metric]["p95"], route[metric]["p95"]
+            if old and new and new > old * (1 + tolerance):
+                found.append(f"{name} {metric} p95 {old:.2f} -> {new:.2f}")
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--routes", default=",".join(ROUTES))
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument(
+        "--latency",
+        default="fixed:0.05",
+        help="fixed:S, uniform:A:B, lognormal:MEDIAN:SIGMA or exp:MEAN (seconds)",
+    )
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--chunk-size", type=int, default=16)
+    parser.add_argument("--chunk-delay", type=float, default=0.01)
+    parser.add_argument("--stream", action="store_true", help="stream ask/teachme")
+    parser.add_argument("--repeat", action="store_true", help="send one prompt")
+    parser.add_argument("--blocked-ips", type=int, default=1000)
+    parser.add_argument("--tokens", type=int, default=100)
+    parser.add_argument("--log-records", type=int, default=0)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--workdir", help="defaults to a fresh temporary directory")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--baseline", help="fail if p95s regress against this report")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    source_dir = os.path.dirname(os.path.abspath(__file__))
+    output_path = os.path.abspath(args.output) if args.output else None
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+    workdir = args.workdir or tempfile.mkdtemp(prefix="geminium-bench-")
+    prepare_workdir(workdir, args.blocked_ips, args.tokens, args.log_records)
+    sys.path.insert(0, source_dir)
+    # The fake model bills tokens too; keep the quota out of the measurement.
+    os.environ.setdefault("TOKEN_QUOTA", "1000000000 per day")
+
+    import api
+
+    api.limiter.enabled = False
+    fake = fakemodel.FakeModel(
+        latency=args.latency,
+        error_rate=args.error_rate,
+        chunk_size=args.chunk_size,
+        chunk_delay=args.chunk_delay,
+        seed=args.seed,
+    )
+    api.model = fake
+
+    report = {
+        "config": {
+            key: value
+            for key, value in vars(args).items()
+            if key not in ("output", "baseline")
+        },
+        "python": platform.python_version(),
+        "routes": {},
+    }
+    for name in args.routes.split(","):
+        report["routes"][name] = run_route(api, name, args)
+    report["upstream_calls"] = fake.calls
+    api.log_writer.close()
+
+    output = json.dumps(report, indent=2)
+    if output_path:
+        with open(output_path, "w") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+
+    if baseline is not None:
+        found = regressions(report, baseline, args.tolerance)
+        for line in found:
+            print(f"regression: {line}", file=sys.stderr)
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
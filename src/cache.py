@@ -0,0 +1,127 @@
+"""Response cache for upstream completions.
+
+Entries are keyed on the endpoint plus the normalized prompt and expire after
+a per-endpoint TTL. An in-memory LRU sits in front of an optional SQLite file
+that survives restarts and is shared by every worker on the host.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import sqlitedb
+
+log = logging.getLogger(__name__)
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS responses "
+    "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)"
+)
+
+
+def normalize_prompt(prompt):
+    return " ".join(prompt.casefold().split())
+
+
+class ResponseCache:
+    def __init__(self, ttls, max_entries=1024, db_path=None, db_timeout=1.0):
+        self.ttls = dict(ttls)
+        self.max_entries = max_entries
+        self.db_path = db_path
+        self.db_timeout = db_timeout
+        self.hits = 0
+        self.misses = 0
+        self.db_errors = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        if db_path:
+            try:
+                sqlitedb.open_database(db_path, SCHEMA).close()
+            except sqlite3.Error:
+                log.exception("Response cache database unavailable; memory only")
+                self.db_path = None
+
+    def enabled(self, endpoint):
+        return bool(self.ttls.get(endpoint))
+
+    def get(self, endpoint, prompt):
+        if not self.enabled(endpoint):
+            return None
+        key = self._key(endpoint, prompt)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+        # The database is read outside the lock so a slow or locked file
+        # only delays this lookup, and any error just counts as a miss.
+        row = self._execute(
+            "SELECT value, expires FROM responses WHERE key = ?", (key,)
+        )
+        with self._lock:
+            if row is not None and row[1] > now:
+                self._remember(key, row[0], row[1])
+                self.hits += 1
+                return row[0]
+            self.misses += 1
+            return None
+
+    def put(self, endpoint, prompt, value):
+        if not self.enabled(endpoint) or not value:
+            return
+        key = self._key(endpoint, prompt)
+        expires = time.time() + self.ttls[endpoint]
+        with self._lock:
+            self._remember(key, value, expires)
+        self._execute(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?)", (key, value, expires)
+        )
+
+    def purge_expired(self):
+        now = time.time()
+        with self._lock:
+            for key in [k for k, (_, exp) in self._entries.items() if exp <= now]:
+                del self._entries[key]
+        self._execute("DELETE FROM responses WHERE expires <= ?", (now,))
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+    def _remember(self, key, value, expires):
+        self._entries[key] = (value, expires)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlitedb.connect(self.db_path, self.db_timeout)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _execute(self, sql, params):
+        # Returns the first row, if any. The cache is an optimisation, so a
+        # database error never fails the request.
+        if not self.db_path:
+            return None
+        try:
+            return self._connection().execute(sql, params).fetchone()
+        except sqlite3.Error as e:
+            self.db_errors += 1
+            log.warning("Response cache database error: %s", e)
+            return None
+
+    @staticmethod
+    def _key(endpoint, prompt):
+        return f"{endpoint}\n{normalize_prompt(prompt)}"
@@ -0,0 +1,129 @@
+"""A local stand-in for genai.GenerativeModel.
+
+Used by the benchmark to drive the app without touching the real API. It
+sleeps for a configurable latency, optionally streams its answer in chunks
+and fails a configurable fraction of calls.
+"""
+
+import json
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+from google.api_core.exceptions import ResourceExhausted
+
+_local = threading.local()
+
+FAKE_THEME = {
+    "v": 1,
+    "orange": "#f9a636",
+    "orangeLight": "#ffcb5b",
+    "orangeDark": "#d48111",
+    "background": "#ffffff",
+    "foreground": "#000000",
+    "foregroundOrange": "#ffffff",
+    "tinting": "#252525",
+}
+
+
+def upstream_seconds():
+    return getattr(_local, "seconds", 0.0)
+
+
+def reset_upstream_seconds():
+    _local.seconds = 0.0
+
+
+def _sleep(seconds):
+    if seconds > 0:
+        time.sleep(seconds)
+    _local.seconds = upstream_seconds() + seconds
+
+
+def parse_latency(spec):
+    kind, _, args = spec.partition(":")
+    values = [float(value) for value in args.split(":") if value]
+    if kind == "fixed":
+        return lambda rng: values[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "lognormal":
+        # lognormal:MEDIAN:SIGMA
+        median, sigma = values
+        return lambda rng: median * rng.lognormvariate(0, sigma)
+    if kind == "exp":
+        return lambda rng: rng.expovariate(1 / values[0])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+class FakeResponse:
+    def __init__(self, text, prompt_tokens, chunks=None, chunk_delay=0.0):
+        self._text = text
+        self._chunks = chunks
+        self._chunk_delay = chunk_delay
+        self.candidates = [SimpleNamespace(finish_reason=SimpleNamespace(name="STOP"))]
+        self.usage_metadata = SimpleNamespace(
+            prompt_token_count=prompt_tokens,
+            candidates_token_count=len(text) // 4,
+            total_token_count=prompt_tokens + len(text) // 4,
+        )
+
+    @property
+    def text(self):
+        return self._text
+
+    @property
+    def parts(self):
+        return [SimpleNamespace(text=self._text)]
+
+    def __iter__(self):
+        for index, chunk in enumerate(self._chunks or [self._text]):
+            if index:
+                _sleep(self._chunk_delay)
+            yield SimpleNamespace(parts=[SimpleNamespace(text=chunk)])
+
+
+class FakeModel:
+    def __init__(
+        self,
+        latency="fixed:0.05",
+        error_rate=0.0,
+        chunk_size=16,
+        chunk_delay=0.01,
+        reply=None,
+        seed=None,
+    ):
+        self.latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+        self.reply = reply
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        with self._lock:
+            self.calls += 1
+            latency = self.latency(self._rng)
+            failed = self._rng.random() < self.error_rate
+        _sleep(latency)
+        if failed:
+            raise ResourceExhausted("Fake upstream quota exceeded")
+        contents = list(contents)
+        text = self.reply or f"Fake answer to: {contents[-1]}"
+        config = kwargs.get("generation_config") or {}
+        if not self.reply and config.get("response_mime_type") == "application/json":
+            text = json.dumps(FAKE_THEME)
+        prompt_tokens = sum(len(str(part)) for part in contents) // 4
+        if not stream:
+            return FakeResponse(text, prompt_tokens)
+        chunks = [
+            text[i : i + self.chunk_size] for i in range(0, len(text), self.chunk_size)
+        ]
+        return FakeResponse(text, prompt_tokens, chunks, self.chunk_delay)
+
+    def count_tokens(self, contents):
+        total = sum(len(str(part)) for part in contents) // 4
+        return SimpleNamespace(total_tokens=total)
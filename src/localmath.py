@@ -0,0 +1,414 @@
+"""Answer simple math questions without the model.
+
+Handles arithmetic with the usual precedence, percentages, exponents,
+numbers written in words and "is N prime?" questions, and formats the answer
+the same way the math prompt asks the model to. solve() returns None for
+anything it doesn't understand so the caller can fall back to the model.
+"""
+
+import re
+from fractions import Fraction
+
+MAX_QUESTION_LENGTH = 200
+MAX_POWER_BITS = 20000
+MAX_PRIME_DIGITS = 100
+DECIMAL_PLACES = 10
+
+UNITS = {
+    "zero": 0,
+    "one": 1,
+    "two": 2,
+    "three": 3,
+    "four": 4,
+    "five": 5,
+    "six": 6,
+    "seven": 7,
+    "eight": 8,
+    "nine": 9,
+    "ten": 10,
+    "eleven": 11,
+    "twelve": 12,
+    "thirteen": 13,
+    "fourteen": 14,
+    "fifteen": 15,
+    "sixteen": 16,
+    "seventeen": 17,
+    "eighteen": 18,
+    "nineteen": 19,
+    "twenty": 20,
+    "thirty": 30,
+    "forty": 40,
+    "fifty": 50,
+    "sixty": 60,
+    "seventy": 70,
+    "eighty": 80,
+    "ninety": 90,
+}
+SCALES = {
+    "thousand": 10**3,
+    "million": 10**6,
+    "billion": 10**9,
+    "trillion": 10**12,
+    "quadrillion": 10**15,
+}
+
+WORD_OPERATORS = [
+    ("to the power of", "^"),
+    ("multiplied by", "*"),
+    ("divided by", "/"),
+    ("plus", "+"),
+    ("minus", "-"),
+    ("times", "*"),
+]
+PREFIXES = re.compile(
+    r"^(?:what\s+is|what's|whats|calculate|compute|evaluate|solve)\s+", re.I
+)
+TOKEN = re.compile(r"\s*(\d+(?:\.\d+)?|\.\d+|\*\*|[-+*/×÷^()%]|of\b)", re.I)
+# "x" only means times when it stands alone between two numbers; "3x + 2"
+# is algebra and goes to the model.
+TIMES_X = re.compile(r"(?<=[\d)])\s+x\s+(?=[\d(.])", re.I)
+LETTER_BY_DIGIT = re.compile(r"[^\W\d_]\d|\d[^\W\d_]")
+PRIME_QUESTION = re.compile(r"^is\s+(.+?)\s+(?:a\s+)?prime(?:\s+number)?\s*\??$", re.I)
+AS_NUMBER = re.compile(r"\s+(?:as\s+a\s+number|in\s+digits)\s*\??$", re.I)
+
+OPERATION_NAMES = {
+    "+": "addition",
+    "-": "subtraction",
+    "*": "multiplication",
+    "/": "division",
+    "^": "exponent",
+}
+SINGLE_STEP = {
+    "+": "Add the two numbers",
+    "-": "Subtract the second number from the first",
+    "*": "Multiply the two numbers",
+    "/": "Divide the first number by the second",
+    "^": "Raise the base to the power of the exponent",
+}
+
+
+class Unsupported(Exception):
+    pass
+
+
+def format_number(value, grouping=False):
+    value = Fraction(value)
+    if value.denominator == 1:
+        return f"{value.numerator:,}" if grouping else str(value.numerator)
+    sign = "-" if value < 0 else ""
+    value = abs(value)
+    scaled = round(value * 10**DECIMAL_PLACES)
+    whole, fraction = divmod(scaled, 10**DECIMAL_PLACES)
+    digits = f"{fraction:0{DECIMAL_PLACES}d}".rstrip("0")
+    whole = f"{whole:,}" if grouping else str(whole)
+    return f"{sign}{whole}.{digits}" if digits else f"{sign}{whole}"
+
+
+def render(question, steps, answer):
+    lines = [f"**Question:** {question}"]
+    for number, step in enumerate(steps, 1):
+        lines.append(f"**Step {number}:** {step}")
+    lines.append(f"**Answer: {answer}**")
+    return "\n\n".join(lines)
+
+
+class Parser:
+    def __init__(self, text):
+        self.tokens = self.tokenize(text)
+        self.position = 0
+        self.steps = []
+        self.operations = []
+
+    @staticmethod
+    def tokenize(text):
+        text = re.sub(
+            r"\b(\d{1,3}(?:,\d{3})+)\b", lambda m: m[1].replace(",", ""), text
+        )
+        if LETTER_BY_DIGIT.search(text):
+            raise Unsupported(text)
+        text = TIMES_X.sub(" * ", text)
+        for words, symbol in WORD_OPERATORS:
+            text = re.sub(rf"\b{words}\b", f" {symbol} ", text, flags=re.I)
+        tokens = []
+        position = 0
+        text = text.rstrip()
+        while position < len(text):
+            match = TOKEN.match(text, position)
+            if not match:
+                raise Unsupported(text[position:])
+            token = match[1].lower()
+            token = {"**": "^", "×": "*", "÷": "/"}.get(token, token)
+            tokens.append(token)
+            position = match.end()
+        return tokens
+
+    def peek(self):
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return None
+
+    def take(self):
+        token = self.peek()
+        self.position += 1
+        return token
+
+    def parse(self):
+        value = self.expression()
+        if self.peek() is not None:
+            raise Unsupported(self.peek())
+        return value
+
+    def expression(self):
+        value = self.term()
+        while self.peek() in ("+", "-"):
+            value = self.apply(self.take(), value, self.term())
+        return value
+
+    def term(self):
+        value = self.unary()
+        while self.peek() in ("*", "/"):
+            value = self.apply(self.take(), value, self.unary())
+        return value
+
+    def unary(self):
+        if self.peek() == "-":
+            self.take()
+            operations = len(self.operations)
+            value = self.unary()
+            if len(self.operations) > operations:
+                # -3^2 is -(3^2); show the sign being applied to the result.
+                self.operations.append("neg")
+                self.steps.append(
+                    f"Apply the negative sign: -({format_number(value)}) = "
+                    f"{format_number(-value)}"
+                )
+            return -value
+        if self.peek() == "+":
+            self.take()
+            return self.unary()
+        return self.power()
+
+    def power(self):
+        base = self.percent()
+        if self.peek() == "^":
+            self.take()
+            return self.apply("^", base, self.unary())
+        return base
+
+    def percent(self):
+        value = self.primary()
+        if self.peek() != "%":
+            return value
+        self.take()
+        decimal = value / 100
+        self.steps.append(
+            f"Convert {format_number(value)}% to decimal form: "
+            f"{format_number(value)}% = {format_number(value)}/100 = "
+            f"{format_number(decimal)}"
+        )
+        if self.peek() != "of":
+            return decimal
+        self.take()
+        number = self.unary()
+        result = decimal * number
+        self.steps.append(
+            "Multiply the decimal form of the percentage by the number: "
+            f"{format_number(decimal)} * {format_number(number)} = "
+            f"{format_number(result)}"
+        )
+        self.operations.append("%")
+        return result
+
+    def primary(self):
+        token = self.take()
+        if token == "(":
+            value = self.expression()
+            if self.take() != ")":
+                raise Unsupported("unbalanced parentheses")
+            return value
+        if token is None or not (token[0].isdigit() or token[0] == "."):
+            raise Unsupported(token)
+        return Fraction(token)
+
+    def apply(self, operator, left, right):
+        if operator == "+":
+            result = left + right
+        elif operator == "-":
+            result = left - right
+        elif operator == "*":
+            result = left * right
+        elif operator == "/":
+            if right == 0:
+                raise Unsupported("division by zero")
+            result = left / right
+        else:
+            result = self.raise_power(left, right)
+        self.operations.append(operator)
+        self.steps.append(
+            (
+                operator,
+                f"{format_number(left)} {operator} {format_number(right)} = "
+                f"{format_number(result)}",
+            )
+        )
+        return result
+
+    @staticmethod
+    def raise_power(base, exponent):
+        if exponent.denominator != 1:
+            raise Unsupported("non-integer exponent")
+        if base == 0 and exponent < 0:
+            raise Unsupported("division by zero")
+        size = max(base.numerator.bit_length(), base.denominator.bit_length())
+        if size * abs(exponent.numerator) > MAX_POWER_BITS:
+            raise Unsupported("result too large")
+        return base ** int(exponent)
+
+
+def describe_steps(steps):
+    arithmetic = [step for step in steps if isinstance(step, tuple)]
+    if len(steps) == 1 and arithmetic:
+        operator, working = arithmetic[0]
+        return [f"{SINGLE_STEP[operator]}: {working}"]
+    described = []
+    for step in steps:
+        if isinstance(step, tuple):
+            operator, working = step
+            step = f"Perform the {OPERATION_NAMES[operator]} operation: {working}"
+        described.append(step)
+    return described
+
+
+def words_to_number(text):
+    # Anything that isn't a well-formed number ("nineteen eighty four",
+    # "one million million") goes to the model rather than being summed.
+    words = re.sub(r"[-,]", " ", text.lower()).split()
+    if not words or not any(
+        word in UNITS or word in SCALES or word == "hundred" for word in words
+    ):
+        return None
+    total = current = 0
+    last = None
+    hundred = False
+    previous_scale = None
+    for word in words:
+        if word == "and":
+            continue
+        if word.isdigit() or word in UNITS:
+            value = int(word) if word.isdigit() else UNITS[word]
+            if last == "tens" and word in UNITS and 1 <= value <= 9:
+                # twenty one
+                current += value
+                last = "unit"
+                continue
+            if last in ("unit", "tens"):
+                return None
+            current += value
+            last = "tens" if word in UNITS and value >= 20 else "unit"
+        elif word == "hundred":
+            if hundred or last == "scale":
+                return None
+            current = (current or 1) * 100
+            hundred = True
+            last = "hundred"
+        elif word in SCALES:
+            scale = SCALES[word]
+            if previous_scale is not None and scale >= previous_scale:
+                return None
+            total += (current or 1) * scale
+            current = 0
+            hundred = False
+            previous_scale = scale
+            last = "scale"
+        else:
+            return None
+    return total + current
+
+
+def parse_integer(text):
+    text = text.strip()
+    if re.fullmatch(r"\d{1,3}(?:,\d{3})+|\d+", text):
+        return int(text.replace(",", ""))
+    return words_to_number(text)
+
+
+def is_probable_prime(n):
+    if n < 2:
+        return False
+    small = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41)
+    for p in small:
+        if n % p == 0:
+            return n == p
+    d, r = n - 1, 0
+    while d % 2 == 0:
+        d //= 2
+        r += 1
+    # These bases are deterministic below 3.3e24 and overwhelmingly
+    # reliable above it.
+    for a in small:
+        x = pow(a, d, n)
+        if x in (1, n - 1):
+            continue
+        for _ in range(r - 1):
+            x = pow(x, 2, n)
+            if x == n - 1:
+                break
+        else:
+            return False
+    return True
+
+
+def smallest_factor(n, limit=100000):
+    if n % 2 == 0:
+        return 2
+    factor = 3
+    while factor * factor <= n and factor <= limit:
+        if n % factor == 0:
+            return factor
+        factor += 2
+    return None
+
+
+def solve_prime(question, operand):
+    n = parse_integer(operand)
+    if n is None or len(str(n)) > MAX_PRIME_DIGITS:
+        return None
+    if is_probable_prime(n):
+        return render(question, [], "Yes")
+    steps = []
+    if n >= 4:
+        factor = smallest_factor(n)
+        if factor is not None:
+            steps.append(
+                f"{n:,} is divisible by {factor:,}: "
+                f"{n:,} / {factor:,} = {n // factor:,}"
+            )
+    return render(question, steps, "No")
+
+
+def solve(question):
+    question = question.strip()
+    if not question or len(question) > MAX_QUESTION_LENGTH:
+        return None
+
+    match = PRIME_QUESTION.match(question)
+    if match:
+        return solve_prime(question, match[1])
+
+    match = AS_NUMBER.search(question)
+    if match:
+        number = words_to_number(question[: match.start()])
+        if number is not None:
+            return render(question, [], format_number(number, grouping=True))
+        return None
+
+    expression = PREFIXES.sub("", question).rstrip("?=. ")
+    parser = None
+    try:
+        parser = Parser(expression)
+        value = parser.parse()
+    except (Unsupported, ValueError, ZeroDivisionError):
+        return None
+    if not parser.operations:
+        return None
+    return render(question, describe_steps(parser.steps), format_number(value))
@@ -0,0 +1,280 @@
+"""Append-only request log.
+
+Records are appended as JSON lines by a background thread so that logging a
+request never touches more than a queue on the hot path. Segments are rotated
+by size and age; run this module directly to query or compact them.
+"""
+
+import argparse
+import atexit
+import fcntl
+import glob
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+
+class LogWriter:
+    def __init__(
+        self,
+        path,
+        max_queue=10000,
+        batch_size=256,
+        flush_interval=1.0,
+        max_bytes=64 * 1024 * 1024,
+        max_age=24 * 60 * 60,
+    ):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._fd = None
+        self._segment_started = None
+        atexit.register(self.close)
+
+    def write(self, record):
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(record)
+            return True
+        except queue.Full:
+            # Never block a request on logging; count what we had to shed.
+            self.dropped += 1
+            return False
+
+    def close(self):
+        thread = self._thread
+        if thread is None or self._pid != os.getpid():
+            return
+        self._queue.put(None)
+        thread.join()
+        self._thread = None
+
+    def _ensure_started(self):
+        # Also restarts the writer in a child forked after the first write.
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._fd = None
+            self._thread = threading.Thread(
+                target=self._run, name="log-writer", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    record = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if record is None:
+                    stopping = True
+                    break
+                batch.append(record)
+            if batch:
+                self._flush(batch)
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _flush(self, batch):
+        data = "".join(
+            json.dumps(record, ensure_ascii=False) + "\n" for record in batch
+        ).encode("utf-8")
+        try:
+            self._maybe_rotate()
+            os.write(self._fd, data)
+            os.fsync(self._fd)
+        except OSError:
+            self.dropped += len(batch)
+            log.exception("Dropped %d log records", len(batch))
+
+    def _open(self):
+        if self._fd is not None:
+            os.close(self._fd)
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._segment_started = _first_timestamp(self.path) or time.time()
+
+    def _maybe_rotate(self):
+        if self._fd is None or _inode(self.path) != os.fstat(self._fd).st_ino:
+            # First write, or another worker rotated the segment under us.
+            self._open()
+        size = os.fstat(self._fd).st_size
+        age = time.time() - self._segment_started
+        if size == 0 or (size < self.max_bytes and age < self.max_age):
+            return
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            if _inode(self.path) == os.fstat(self._fd).st_ino:
+                os.rename(self.path, _rotated_name(self.path))
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._open()
+
+
+def _inode(path):
+    try:
+        return os.stat(path).st_ino
+    except FileNotFoundError:
+        return None
+
+
+def _first_timestamp(path):
+    try:
+        with open(path, encoding="utf-8") as file:
+            return json.loads(file.readline()).get("ts")
+    except (OSError, ValueError):
+        return None
+
+
+def _rotated_name(path):
+    stamp = time.time_ns() // 1000
+    while os.path.exists(f"{path}.{stamp}"):
+        stamp += 1
+    return f"{path}.{stamp}"
+
+
+def segments(path):
+    rotated = []
+    for name in glob.glob(glob.escape(path) + ".*"):
+        suffix = name[len(path) + 1 :]
+        if suffix.isdigit():
+            rotated.append((int(suffix), name))
+    names = [name for _, name in sorted(rotated)]
+    if os.path.exists(path):
+        names.append(path)
+    return names
+
+
+def iter_records(path):
+    for name in segments(path):
+        with open(name, encoding="utf-8") as file:
+            for line in file:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # A worker killed mid-write can leave a torn last line.
+                    continue
+
+
+def build_view(records, ip=None, command=None):
+    view = {}
+    for record in records:
+        if ip is not None and record["ip"] != ip:
+            continue
+        if command is not None and record["command"] != command:
+            continue
+        commands = view.setdefault(record["ip"], {})
+        commands.setdefault(record["command"], []).extend(record["prompts"])
+    return view
+
+
+def import_legacy(legacy_path, path):
+    # The old log was one JSON object rewritten per request:
+    # {ip: {command: [prompts]}}. It becomes the oldest segment so the view
+    # and compaction cover it like any other.
+    with open(legacy_path, encoding="utf-8") as file:
+        legacy = json.load(file)
+    target = f"{path}.0"
+    if os.path.exists(target):
+        raise FileExistsError(target)
+    ts = os.path.getmtime(legacy_path)
+    count = 0
+    with open(target + ".tmp", "w", encoding="utf-8") as out:
+        for ip, commands in legacy.items():
+            for command, prompts in commands.items():
+                record = {"ts": ts, "ip": ip, "command": command, "prompts": prompts}
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                count += 1
+        out.flush()
+        os.fsync(out.fileno())
+    os.replace(target + ".tmp", target)
+    return count
+
+
+def compact(path):
+    rotated = segments(path)
+    if rotated and rotated[-1] == path:
+        rotated.pop()
+    if len(rotated) < 2:
+        return 0
+    target = rotated[0]
+    tmp = target + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as out:
+        for name in rotated:
+            with open(name, encoding="utf-8") as file:
+                for line in file:
+                    if line.strip():
+                        out.write(line if line.endswith("\n") else line + "\n")
+        out.flush()
+        os.fsync(out.fileno())
+    os.replace(tmp, target)
+    for name in rotated[1:]:
+        os.remove(name)
+    return len(rotated)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query or compact request logs")
+    parser.add_argument("path", nargs="?", default="logs.jsonl")
+    commands = parser.add_subparsers(dest="action", required=True)
+    view = commands.add_parser("view", help="print the per-IP/per-command view")
+    view.add_argument("--ip")
+    view.add_argument("--command")
+    view.add_argument("--output", help="write to a file instead of stdout")
+    commands.add_parser("compact", help="merge rotated segments into one")
+    legacy = commands.add_parser(
+        "import", help="add records from the old logs.json as the oldest segment"
+    )
+    legacy.add_argument("legacy_path", nargs="?", default="logs.json")
+    args = parser.parse_args(argv)
+
+    if args.action == "import":
+        try:
+            count = import_legacy(args.legacy_path, args.path)
+        except FileExistsError as e:
+            sys.exit(f"already imported: {e}")
+        print(f"imported {count} records from {args.legacy_path}")
+        return
+
+    if args.action == "compact":
+        merged = compact(args.path)
+        print(f"merged {merged} segments" if merged else "nothing to compact")
+        return
+
+    result = build_view(iter_records(args.path), ip=args.ip, command=args.command)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(result, file, indent=2)
+    else:
+        json.dump(result, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""Rate-limit storage shared by every worker on the host.
+
+SQLiteStorage registers the ``sqlite:///path`` scheme with ``limits`` so
+flask_limiter can use it directly. Each operation runs in its own
+``BEGIN IMMEDIATE`` transaction, which makes the sliding window check and
+increment atomic across processes without a network hop.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from math import floor
+
+from limits.storage import SlidingWindowCounterSupport, Storage
+from limits.storage.base import TimestampedSlidingWindow
+from limits.strategies import SlidingWindowCounterRateLimiter
+
+import sqlitedb
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS counters "
+    "(key TEXT PRIMARY KEY, count INTEGER NOT NULL, expires REAL NOT NULL)"
+)
+
+
+class SQLiteStorage(Storage, SlidingWindowCounterSupport, TimestampedSlidingWindow):
+    STORAGE_SCHEME = ["sqlite"]
+
+    def __init__(self, uri=None, wrap_exceptions=False, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        # sqlite:///relative.db or sqlite:////absolute.db, as in SQLAlchemy.
+        self.path = uri[len("sqlite:///") :] if uri else "ratelimits.db"
+        self._local = threading.local()
+        self._operations = 0
+        self._setup_lock = threading.Lock()
+        self._setup_pid = None
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            self._setup()
+            connection = sqlitedb.connect(self.path)
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _setup(self):
+        # WAL mode and the table live in the file, so each process only has
+        # to make sure of them once rather than on every new connection.
+        if self._setup_pid == os.getpid():
+            return
+        with self._setup_lock:
+            if self._setup_pid != os.getpid():
+                sqlitedb.open_database(self.path, SCHEMA).close()
+                self._setup_pid = os.getpid()
+
+    def _transaction(self, fn):
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(connection, time.time())
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+        self._operations += 1
+        if self._operations % 1000 == 0:
+            connection.execute(
+                "DELETE FROM counters WHERE expires <= ?", (time.time(),)
+            )
+        return result
+
+    @staticmethod
+    def _get(connection, key, now):
+        row = connection.execute(
+            "SELECT count FROM counters WHERE key = ? AND expires > ?", (key, now)
+        ).fetchone()
+        return row[0] if row else 0
+
+    @staticmethod
+    def _incr(connection, key, expiry, amount, now):
+        # A lapsed key restarts from zero with a fresh expiry.
+        connection.execute(
+            "INSERT INTO counters VALUES (?1, ?2, ?3) ON CONFLICT(key) DO UPDATE SET "
+            "count = CASE WHEN expires > ?4 THEN count + ?2 ELSE ?2 END, "
+            "expires = CASE WHEN expires > ?4 THEN expires ELSE ?3 END",
+            (key, amount, now + expiry, now),
+        )
+        return SQLiteStorage._get(connection, key, now)
+
+    def incr(self, key, expiry, amount=1):
+        return self._transaction(
+            lambda connection, now: self._incr(connection, key, expiry, amount, now)
+        )
+
+    def get(self, key):
+        return self._transaction(
+            lambda connection, now: self._get(connection, key, now)
+        )
+
+    def get_expiry(self, key):
+        def fn(connection, now):
+            row = connection.execute(
+                "SELECT expires FROM counters WHERE key = ?", (key,)
+            ).fetchone()
+            return row[0] if row and row[0] > now else now
+
+        return self._transaction(fn)
+
+    def check(self):
+        try:
+            self._connection().execute("SELECT 1")
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self):
+        return self._transaction(
+            lambda connection, now: connection.execute("DELETE FROM counters").rowcount
+        )
+
+    def clear(self, key):
+        self._transaction(
+            lambda connection, now: connection.execute(
+                "DELETE FROM counters WHERE key = ?", (key,)
+            )
+        )
+
+    def _window(self, connection, key, expiry, now):
+        previous_key, current_key = self.sliding_window_keys(key, expiry, now)
+        previous_count = self._get(connection, previous_key, now)
+        current_count = self._get(connection, current_key, now)
+        if previous_count == 0:
+            previous_ttl = 0.0
+        else:
+            previous_ttl = (1 - (((now - expiry) / expiry) % 1)) * expiry
+        current_ttl = (1 - ((now / expiry) % 1)) * expiry + expiry
+        return previous_count, previous_ttl, current_count, current_ttl
+
+    def acquire_sliding_window_entry(self, key, limit, expiry, amount=1):
+        if amount > limit:
+            return False
+
+        def fn(connection, now):
+            previous_count, previous_ttl, current_count, _ = self._window(
+                connection, key, expiry, now
+            )
+            weighted = previous_count * previous_ttl / expiry + current_count
+            if floor(weighted) + amount > limit:
+                return False
+            _, current_key = self.sliding_window_keys(key, expiry, now)
+            self._incr(connection, current_key, 2 * expiry, amount, now)
+            return True
+
+        return self._transaction(fn)
+
+    def get_sliding_window(self, key, expiry):
+        return self._transaction(
+            lambda connection, now: self._window(connection, key, expiry, now)
+        )
+
+    def clear_sliding_window(self, key, expiry):
+        def fn(connection, now):
+            for window_key in self.sliding_window_keys(key, expiry, now):
+                connection.execute("DELETE FROM counters WHERE key = ?", (window_key,))
+
+        self._transaction(fn)
+
+
+class QuotaExceeded(Exception):
+    def __init__(self, retry_after):
+        super().__init__("Token quota exceeded, try again later")
+        self.retry_after = retry_after
+
+
+class TokenQuota:
+    # Counts billed tokens per caller on the same sliding windows as the
+    # request limits. Usage is only known after a call, so a call is allowed
+    # while the caller is under quota and charged in full afterwards.
+    def __init__(self, storage, limit, authenticated_limit):
+        self.storage = storage
+        self.limit = limit
+        self.authenticated_limit = authenticated_limit
+        self.strategy = SlidingWindowCounterRateLimiter(storage)
+
+    def _item(self, authenticated):
+        return self.authenticated_limit if authenticated else self.limit
+
+    def check(self, caller, authenticated):
+        item = self._item(authenticated)
+        if not self.strategy.test(item, caller):
+            stats = self.strategy.get_window_stats(item, caller)
+            raise QuotaExceeded(max(1, int(stats.reset_time - time.time())))
+
+    def charge(self, caller, authenticated, tokens):
+        if tokens <= 0:
+            return
+        item = self._item(authenticated)
+        expiry = item.get_expiry()
+        _, current_key = self.storage.sliding_window_keys(
+            item.key_for(caller), expiry, time.time()
+        )
+        self.storage.incr(current_key, 2 * expiry, amount=tokens)
@@ -0,0 +1,60 @@
+"""Coalesce identical in-flight calls.
+
+The first caller for a key runs the call; callers that arrive while it is in
+flight wait for it and share its result or error. Nothing is kept once the
+call finishes.
+"""
+
+import copy
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self, max_wait):
+        self.max_wait = max_wait
+        self.calls = 0
+        self.coalesced = 0
+        self.timeouts = 0
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = self._in_flight[key] = _Call()
+                self.calls += 1
+            else:
+                self.coalesced += 1
+
+        if leader:
+            try:
+                call.result = fn()
+                return call.result
+            except BaseException as e:
+                call.error = e
+                raise
+            finally:
+                with self._lock:
+                    del self._in_flight[key]
+                call.done.set()
+
+        if not call.done.wait(self.max_wait):
+            self.timeouts += 1
+            raise TimeoutError("Timed out waiting for an identical request")
+        if call.error is not None:
+            # Raise a copy so waiters don't all append to one traceback.
+            try:
+                error = copy.copy(call.error)
+            except Exception:
+                error = call.error
+            raise error from call.error
+        return call.result
@@ -0,0 +1,41 @@
+"""Open SQLite files that several worker processes share.
+
+Switching a file to WAL and creating its tables both need a write lock, and
+SQLite reports "database is locked" straight away on some of those paths
+instead of waiting on the busy timeout. That happens when every worker opens
+the same fresh file at boot, so setup retries for up to ``timeout`` seconds.
+"""
+
+import sqlite3
+import time
+
+
+def _retry(fn, timeout):
+    deadline = time.monotonic() + timeout
+    delay = 0.01
+    while True:
+        try:
+            return fn()
+        except sqlite3.OperationalError as e:
+            if "locked" not in str(e) and "busy" not in str(e):
+                raise
+            if time.monotonic() >= deadline:
+                raise
+        time.sleep(delay)
+        delay = min(delay * 2, 0.25)
+
+
+def connect(path, timeout=5.0, **kwargs):
+    return sqlite3.connect(path, timeout=timeout, isolation_level=None, **kwargs)
+
+
+def open_database(path, schema, timeout=5.0, **kwargs):
+    connection = connect(path, timeout, **kwargs)
+    try:
+        connection.execute("PRAGMA journal_mode=WAL")
+    except sqlite3.OperationalError:
+        # Another process is switching the file at the same moment. The
+        # mode is stored in the file, so its switch covers this connection.
+        pass
+    _retry(lambda: connection.execute(schema), timeout)
+    return connection
@@ -0,0 +1,57 @@
+"""Server-sent events for streaming completions."""
+
+import json
+
+from flask import Response
+
+from upstream import cancel_stream, chunk_text, finish_reason, response_usage
+
+
+def wants_stream(request):
+    if request.json.get("stream"):
+        return True
+    return any(
+        mimetype == "text/event-stream" and quality > 0
+        for mimetype, quality in request.accept_mimetypes
+    )
+
+
+def sse_event(data, event=None):
+    message = f"data: {json.dumps(data)}\n\n"
+    if event:
+        message = f"event: {event}\n" + message
+    return message
+
+
+def stream_completion(response, on_close=None):
+    finished = False
+    try:
+        for chunk in response:
+            text = chunk_text(chunk)
+            if text:
+                yield sse_event({"text": text})
+        finished = True
+        yield sse_event(
+            {
+                "finish_reason": finish_reason(response),
+                "usage": response_usage(response),
+            },
+            event="done",
+        )
+    except Exception as e:
+        yield sse_event({"error": str(e)}, event="error")
+    finally:
+        # Reached without finishing when the client disconnects mid-stream
+        # and the server closes this generator.
+        if not finished:
+            cancel_stream(response)
+        if on_close is not None:
+            on_close(response)
+
+
+def sse_response(response, on_close=None):
+    return Response(
+        stream_completion(response, on_close),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
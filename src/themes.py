@@ -0,0 +1,238 @@
+"""Build v1 Meower themes locally.
+
+synthesize() understands simple styles: one accent (a named color from the
+themium prompt's palette or a hex code), light/dark/AMOLED keywords, and
+"make this theme light/dark mode: {json}". It returns None for anything else
+so the caller can ask the model, whose output goes through parse_theme().
+"""
+
+import colorsys
+import json
+import re
+
+from jsonschema import Draft7Validator
+
+THEME_KEYS = (
+    "orange",
+    "orangeLight",
+    "orangeDark",
+    "background",
+    "foreground",
+    "foregroundOrange",
+    "tinting",
+)
+
+theme_schema = {
+    "type": "object",
+    "properties": {
+        "v": {"const": 1},
+        **{
+            key: {"type": "string", "pattern": "^#[0-9a-fA-F]{6}$"}
+            for key in THEME_KEYS
+        },
+    },
+    "required": ["v", *THEME_KEYS],
+}
+theme_validator = Draft7Validator(theme_schema)
+
+DEFAULT_THEME = {
+    "v": 1,
+    "orange": "#f9a636",
+    "orangeLight": "#ffcb5b",
+    "orangeDark": "#d48111",
+    "background": "#ffffff",
+    "foreground": "#000000",
+    "foregroundOrange": "#ffffff",
+    "tinting": "#252525",
+}
+
+# The palette listed in the themium prompt.
+NAMED_COLORS = {
+    "meower orange": "#fc5d11",
+    "mint green": "#98fb98",
+    "blue green": "#0d98ba",
+    "cobalt blue": "#0047ab",
+    "toothpaste blue": "#b1eae8",
+    "blue purple": "#8a2be2",
+    "red": "#ff0000",
+    "orange": "#ffa500",
+    "yellow": "#ffff00",
+    "green": "#008000",
+    "lime": "#32cd32",
+    "cyan": "#00ffff",
+    "blue": "#0000ff",
+    "teal": "#008080",
+    "indigo": "#4b0082",
+    "purple": "#800080",
+    "violet": "#7f00ff",
+    "pink": "#ffc0cb",
+    "grey": "#808080",
+    "gray": "#808080",
+}
+
+MODES = {
+    "light": {"background": "#ffffff", "foreground": "#000000"},
+    "dark": {"background": "#181818", "foreground": "#ffffff"},
+    "amoled": {"background": "#000000", "foreground": "#ffffff"},
+}
+
+FILLER = {
+    "a",
+    "an",
+    "and",
+    "accent",
+    "accents",
+    "color",
+    "colors",
+    "colour",
+    "colours",
+    "colored",
+    "coloured",
+    "for",
+    "me",
+    "make",
+    "main",
+    "mode",
+    "please",
+    "scheme",
+    "style",
+    "the",
+    "theme",
+    "with",
+}
+
+CONVERT = re.compile(
+    r"^\s*make\s+this\s+theme\s+(light|dark)\s+mode\s*:\s*(\{.*\})\s*$", re.I | re.S
+)
+HEX = re.compile(r"#([0-9a-f]{6}|[0-9a-f]{3})\b", re.I)
+COLOR_NAMES = re.compile(
+    r"\b("
+    + "|".join(sorted(map(re.escape, NAMED_COLORS), key=len, reverse=True))
+    + r")\b"
+)
+MODE_WORDS = re.compile(r"\b(amoled|oled|pitch[\s-]+black|dark|light)\b")
+
+
+def to_rgb(hex_color):
+    hex_color = hex_color.lstrip("#")
+    if len(hex_color) == 3:
+        hex_color = "".join(c * 2 for c in hex_color)
+    return tuple(int(hex_color[i : i + 2], 16) / 255 for i in (0, 2, 4))
+
+
+def to_hex(rgb):
+    return "#" + "".join(f"{round(max(0, min(1, c)) * 255):02x}" for c in rgb)
+
+
+def with_lightness(hex_color, lightness):
+    hue, _, saturation = colorsys.rgb_to_hls(*to_rgb(hex_color))
+    return to_hex(colorsys.hls_to_rgb(hue, max(0, min(1, lightness)), saturation))
+
+
+def shift_lightness(hex_color, amount):
+    _, lightness, _ = colorsys.rgb_to_hls(*to_rgb(hex_color))
+    return with_lightness(hex_color, lightness + amount)
+
+
+def relative_luminance(hex_color):
+    def channel(c):
+        return c / 12.92 if c <= 0.03928 else ((c + 0.055) / 1.055) ** 2.4
+
+    r, g, b = (channel(c) for c in to_rgb(hex_color))
+    return 0.2126 * r + 0.7152 * g + 0.0722 * b
+
+
+def contrast(a, b):
+    high, low = sorted((relative_luminance(a), relative_luminance(b)), reverse=True)
+    return (high + 0.05) / (low + 0.05)
+
+
+def readable_on(hex_color):
+    if contrast(hex_color, "#ffffff") >= contrast(hex_color, "#000000"):
+        return "#ffffff"
+    return "#000000"
+
+
+def build_theme(accent, mode, tinting=None):
+    accent = to_hex(to_rgb(accent))
+    if tinting is None:
+        # AMOLED themes tint with a near-black shade of the accent.
+        tinting = with_lightness(accent, 0.06) if mode == "amoled" else "#252525"
+    return {
+        "v": 1,
+        "orange": accent,
+        "orangeLight": shift_lightness(accent, 0.1),
+        "orangeDark": shift_lightness(accent, -0.12),
+        **MODES[mode],
+        "foregroundOrange": readable_on(accent),
+        "tinting": tinting,
+    }
+
+
+def dump(theme):
+    return json.dumps(
+        {"v": 1, **{key: theme[key] for key in THEME_KEYS}}, separators=(",", ":")
+    )
+
+
+def convert(mode, source):
+    try:
+        theme = json.loads(source)
+    except ValueError:
+        return None
+    if not isinstance(theme, dict) or not HEX.fullmatch(str(theme.get("orange", ""))):
+        return None
+    tinting = theme.get("tinting")
+    if isinstance(tinting, str) and HEX.fullmatch(tinting):
+        # Expand #abc so the result still matches theme_schema.
+        tinting = to_hex(to_rgb(tinting))
+    else:
+        tinting = None
+    return dump(build_theme(theme["orange"], mode, tinting))
+
+
+def synthesize(style):
+    match = CONVERT.match(style)
+    if match:
+        return convert(match[1].lower(), match[2])
+
+    text = style.lower().strip().rstrip(".!")
+    # "default orange" is Meower's own orange, not the palette's.
+    text = re.sub(r"\bdefault\s+orange\b", "default", text)
+    accents = [match[0] for match in HEX.finditer(text)]
+    text = HEX.sub(" ", text)
+    accents += [NAMED_COLORS[match[1]] for match in COLOR_NAMES.finditer(text)]
+    text = COLOR_NAMES.sub(" ", text)
+    modes = set()
+    for word in MODE_WORDS.findall(text):
+        word = re.sub(r"[\s-]+", " ", word)
+        modes.add("amoled" if word in ("amoled", "oled", "pitch black") else word)
+    text = MODE_WORDS.sub(" ", text)
+    default = re.search(r"\bdefault\b", text) is not None
+    text = re.sub(r"\bdefault\b", " ", text)
+
+    leftover = [word for word in re.findall(r"[a-z0-9']+", text) if word not in FILLER]
+    if leftover or len(accents) > 1 or len(modes) > 1:
+        return None
+    mode = modes.pop() if modes else "light"
+    if not accents:
+        if not default:
+            return None
+        if mode == "light":
+            return dump(DEFAULT_THEME)
+        accents = [DEFAULT_THEME["orange"]]
+    return dump(build_theme(accents[0], mode))
+
+
+def parse_theme(text):
+    # Returns the compact JSON for a valid theme, or None.
+    text = text.strip()
+    if text.startswith("```"):
+        text = re.sub(r"^```(?:json)?\s*|\s*```$", "", text)
+    try:
+        theme = json.loads(text)
+    except ValueError:
+        return None
+    if not theme_validator.is_valid(theme):
+        return None
+    return dump(theme)
@@ -0,0 +1,120 @@
+"""Helpers for talking to the upstream Gemini model."""
+
+import threading
+import time
+
+
+class UpstreamBusy(Exception):
+    def __init__(self, retry_after):
+        super().__init__("Too many requests in flight, try again later")
+        self.retry_after = retry_after
+
+
+class UpstreamLimiter:
+    def __init__(self, max_concurrency, max_waiting, max_wait, retry_after=5):
+        self.max_concurrency = max_concurrency
+        self.max_waiting = max_waiting
+        self.max_wait = max_wait
+        self.retry_after = retry_after
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            if self.active < self.max_concurrency:
+                self.active += 1
+                return
+            if self.waiting >= self.max_waiting:
+                self.rejected += 1
+                raise UpstreamBusy(self.retry_after)
+            self.waiting += 1
+            try:
+                deadline = time.monotonic() + self.max_wait
+                while self.active >= self.max_concurrency:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.rejected += 1
+                        raise UpstreamBusy(self.retry_after)
+                    self._cond.wait(remaining)
+                self.active += 1
+            finally:
+                self.waiting -= 1
+
+    def release(self):
+        with self._cond:
+            self.active -= 1
+            self._cond.notify()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class PendingLimit:
+    # Caps work handed to a thread pool, whose own queue is unbounded.
+    # reserve() never blocks: it takes all the slots or raises UpstreamBusy.
+    def __init__(self, max_pending, retry_after=5):
+        self.max_pending = max_pending
+        self.retry_after = retry_after
+        self.pending = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def reserve(self, count=1):
+        with self._lock:
+            if self.pending + count > self.max_pending:
+                self.rejected += 1
+                raise UpstreamBusy(self.retry_after)
+            self.pending += count
+
+    def release(self, count=1):
+        with self._lock:
+            self.pending -= count
+
+
+def response_usage(response):
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return {}
+    return {
+        "prompt_tokens": getattr(usage, "prompt_token_count", 0) or 0,
+        "completion_tokens": getattr(usage, "candidates_token_count", 0) or 0,
+        "total_tokens": getattr(usage, "total_token_count", 0) or 0,
+    }
+
+
+def finish_reason(response):
+    try:
+        candidates = response.candidates
+    except Exception:
+        return None
+    if not candidates:
+        return None
+    reason = candidates[0].finish_reason
+    return getattr(reason, "name", str(reason))
+
+
+def chunk_text(chunk):
+    try:
+        return "".join(part.text for part in chunk.parts)
+    except ValueError:
+        # Chunks that only carry a finish reason or safety ratings have no parts.
+        return ""
+
+
+def cancel_stream(response):
+    # The SDK has no public cancel; the wrapped gRPC/REST stream usually does.
+    iterator = getattr(response, "_iterator", None)
+    for name in ("cancel", "close"):
+        method = getattr(iterator, name, None)
+        if callable(method):
+            try:
+                method()
+            except Exception:
+                pass
+            return
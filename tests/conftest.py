@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The app imports its modules by plain name from src/, as it does when run
+# from there.
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
@@ -0,0 +1,84 @@
+import json
+import os
+
+import pytest
+
+from acl import BlocklistStore, IPBlocklist, TokenStore
+
+
+@pytest.mark.parametrize(
+    "entries, ip, blocked",
+    [
+        (["192.168.1.5"], "192.168.1.5", True),
+        (["192.168.1.5"], "192.168.1.6", False),
+        (["192.168.1.5"], "::ffff:192.168.1.5", True),
+        (["::ffff:192.168.1.5"], "192.168.1.5", True),
+        (["10.0.0.0/8"], "10.2.3.4", True),
+        (["10.0.0.0/8"], "11.0.0.1", False),
+        (["10.0.0.0/8"], "::ffff:10.2.3.4", True),
+        (["::ffff:10.0.0.0/104"], "10.2.3.4", True),
+        (["10.0.0.0/24", "10.0.1.0/24"], "10.0.1.255", True),
+        (["10.0.0.0/24", "10.0.2.0/24"], "10.0.1.1", False),
+        (["10.0.0.1/8"], "10.9.9.9", True),
+        (["2001:db8::/32"], "2001:db8::1", True),
+        (["2001:db8::/32"], "2001:db9::1", False),
+        (["2001:DB8::1"], "2001:db8:0::1", True),
+        (["192.168.1.5"], "not an ip", False),
+        (["192.168.1.5", 5, None, "bad/cidr"], "192.168.1.5", True),
+    ],
+)
+def test_blocklist_lookup(entries, ip, blocked):
+    assert (ip in IPBlocklist(entries)) is blocked
+
+
+def write(path, entries):
+    path.write_text(json.dumps(entries) if not isinstance(entries, str) else entries)
+    # Force a new mtime even when writes land in the same timestamp tick.
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+
+@pytest.fixture
+def blocklist(tmp_path):
+    path = tmp_path / "blockedips.json"
+    write(path, ["10.0.0.0/8"])
+    return path, BlocklistStore(str(path), check_interval=0)
+
+
+def test_reload_picks_up_changes(blocklist):
+    path, store = blocklist
+    assert "10.2.3.4" in store
+    write(path, ["192.0.2.1"])
+    assert "10.2.3.4" not in store
+    assert "192.0.2.1" in store
+
+
+def test_missing_file_blocks_nothing(tmp_path):
+    assert "10.2.3.4" not in BlocklistStore(str(tmp_path / "missing.json"))
+
+
+@pytest.mark.parametrize(
+    "content", ['{"x": 1}', '"10.2.3.4"', "5", "null", '["10.', ""]
+)
+def test_malformed_file_keeps_last_snapshot(blocklist, content):
+    path, store = blocklist
+    write(path, content)
+    assert "10.2.3.4" in store
+
+
+def test_invalidate_forces_reload(tmp_path):
+    path = tmp_path / "tokens.json"
+    write(path, ["a"])
+    store = TokenStore(str(path), check_interval=3600)
+    assert "a" in store
+    write(path, ["b"])
+    assert "b" not in store
+    store.invalidate()
+    assert "b" in store and "a" not in store
+
+
+def test_tokens_skip_non_strings(tmp_path):
+    path = tmp_path / "tokens.json"
+    write(path, ["a", 1, ["b"]])
+    store = TokenStore(str(path))
+    assert "a" in store and 1 not in store
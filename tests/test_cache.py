@@ -0,0 +1,57 @@
+import sqlite3
+
+import pytest
+
+from cache import ResponseCache
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "cache.db")
+
+
+def test_lookups_ignore_case_and_spacing():
+    cache = ResponseCache({"/math": 60})
+    cache.put("/math", "What is  2+2?", "4")
+    assert cache.get("/math", "what is 2+2? ") == "4"
+    assert cache.stats() == {"hits": 1, "misses": 0, "size": 1}
+
+
+def test_endpoints_without_a_ttl_are_not_cached():
+    cache = ResponseCache({"/math": 60, "/ask": 0})
+    cache.put("/ask", "q", "a")
+    assert cache.get("/ask", "q") is None
+
+
+def test_expired_entries_miss(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("cache.time.time", lambda: now[0])
+    cache = ResponseCache({"/math": 60})
+    cache.put("/math", "q", "a")
+    now[0] += 61
+    assert cache.get("/math", "q") is None
+
+
+def test_lru_evicts_oldest():
+    cache = ResponseCache({"/math": 60}, max_entries=2)
+    for prompt in ("a", "b", "c"):
+        cache.put("/math", prompt, prompt)
+    assert cache.get("/math", "a") is None
+    assert cache.get("/math", "c") == "c"
+
+
+def test_database_is_shared_between_instances(db_path):
+    ResponseCache({"/math": 60}, db_path=db_path).put("/math", "q", "a")
+    assert ResponseCache({"/math": 60}, db_path=db_path).get("/math", "q") == "a"
+
+
+def test_database_errors_do_not_fail_requests(db_path):
+    cache = ResponseCache({"/math": 60}, db_path=db_path, db_timeout=0.05)
+    other = sqlite3.connect(db_path, isolation_level=None)
+    other.execute("BEGIN EXCLUSIVE")
+    try:
+        cache.put("/math", "q", "a")
+        assert cache.db_errors == 1
+        assert cache.get("/math", "q") == "a"
+    finally:
+        other.execute("ROLLBACK")
@@ -0,0 +1,110 @@
+import pytest
+
+import localmath
+
+
+def answer(question):
+    result = localmath.solve(question)
+    if result is None:
+        return None
+    return result.rsplit("**Answer: ", 1)[1].rstrip("*")
+
+
+@pytest.mark.parametrize(
+    "question, expected",
+    [
+        # The math prompt's few-shot examples. The prompt's own answer for
+        # 55% of 98.3 (53.665) is wrong; 0.55 * 98.3 is 54.065.
+        ("23 + 4 / 5", "23.8"),
+        ("55% of 98.3", "54.065"),
+        ("2 + 1", "3"),
+        (
+            "98 billion 320 million 22 thousand 3 hundred and 44 as a number",
+            "98,320,022,344",
+        ),
+        ("Is 23 a prime number?", "Yes"),
+        ("What's 21 + 89?", "110"),
+        ("is 91 prime?", "No"),
+        ("What is 2 to the power of 10?", "1024"),
+        ("3 x 4", "12"),
+        ("12 × 3", "36"),
+        ("(2+3) x (1+1)", "10"),
+        ("1 / 3", "0.3333333333"),
+        ("-3^2", "-9"),
+        ("(-3)^2", "9"),
+        ("-(2+3)*2", "-10"),
+        ("-5 + 3", "-2"),
+        ("2^-1", "0.5"),
+        ("1,000 + 1", "1001"),
+        ("twenty one as a number", "21"),
+        ("one hundred and five as a number", "105"),
+        ("one hundred thousand two hundred as a number", "100,200"),
+        ("Is one hundred and one prime?", "Yes"),
+    ],
+)
+def test_answers(question, expected):
+    assert answer(question) == expected
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        "What is 3x + 2?",
+        "2x+3",
+        "3x4",
+        "x + 1",
+        "2 x y",
+        "5 / 0",
+        "0 ^ -1",
+        "2^100000",
+        "10 ^ 0.5",
+        "what is love?",
+        "42",
+        "(1 + 2",
+        "1 + " * 100 + "1",
+        # Adjacent number words are not a number; don't add them up.
+        "nineteen eighty four as a number",
+        "is nineteen eighty four prime?",
+        "one million million as a number",
+        "five twenty as a number",
+        "twenty 1 as a number",
+        "one hundred hundred as a number",
+        "one thousand million as a number",
+    ],
+)
+def test_hands_off_to_the_model(question):
+    assert localmath.solve(question) is None
+
+
+def test_steps_follow_the_prompt_format():
+    assert localmath.solve("2 + 1") == (
+        "**Question:** 2 + 1\n\n"
+        "**Step 1:** Add the two numbers: 2 + 1 = 3\n\n"
+        "**Answer: 3**"
+    )
+
+
+def test_negation_gets_its_own_step():
+    steps = localmath.solve("-3^2").split("\n\n")[1:-1]
+    assert steps == [
+        "**Step 1:** Perform the exponent operation: 3 ^ 2 = 9",
+        "**Step 2:** Apply the negative sign: -(9) = -9",
+    ]
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("twenty one", 21),
+        ("nineteen hundred", 1900),
+        ("3 hundred and 44", 344),
+        ("nineteen eighty four", None),
+        ("one million million", None),
+        ("five twenty", None),
+        ("hundred hundred", None),
+        ("two thousand one thousand", None),
+        ("3 4", None),
+    ],
+)
+def test_words_to_number(text, expected):
+    assert localmath.words_to_number(text) == expected
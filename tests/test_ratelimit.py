@@ -0,0 +1,120 @@
+import multiprocessing
+import time
+
+import pytest
+from limits import parse
+from limits.storage import storage_from_string
+from limits.strategies import SlidingWindowCounterRateLimiter
+
+from ratelimit import QuotaExceeded, SQLiteStorage, TokenQuota
+
+
+@pytest.fixture
+def uri(tmp_path):
+    return f"sqlite:///{tmp_path / 'ratelimits.db'}"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # Start mid-window so the sliding window arithmetic is exercised.
+    now = [1_700_000_030.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    return now
+
+
+def test_uri_scheme_is_registered(uri, tmp_path):
+    storage = storage_from_string(uri)
+    assert isinstance(storage, SQLiteStorage)
+    assert storage.path == str(tmp_path / "ratelimits.db")
+
+
+def test_incr_get_and_expiry(uri, clock):
+    storage = SQLiteStorage(uri)
+    assert storage.incr("k", 10) == 1
+    assert storage.incr("k", 10, amount=4) == 5
+    assert storage.get("k") == 5
+    clock[0] += 11
+    assert storage.get("k") == 0
+    assert storage.incr("k", 10) == 1
+
+
+def test_sliding_window_allows_limit_then_recovers(uri, clock):
+    limiter = SlidingWindowCounterRateLimiter(SQLiteStorage(uri))
+    item = parse("5 per minute")
+    assert all(limiter.hit(item, "caller") for _ in range(5))
+    assert not limiter.hit(item, "caller")
+    assert limiter.hit(item, "someone else")
+    # Two full windows later the previous window no longer counts at all.
+    clock[0] += 120
+    assert limiter.hit(item, "caller")
+
+
+def _hammer(uri, start, attempts, results):
+    limiter = SlidingWindowCounterRateLimiter(SQLiteStorage(uri))
+    # A day-long window, so the run can't straddle a window boundary.
+    item = parse("50 per day")
+    while time.time() < start:
+        pass
+    results.put(sum(limiter.hit(item, "shared") for _ in range(attempts)))
+
+
+def test_limit_is_exact_across_processes(uri):
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    start = time.time() + 0.5
+    workers = [
+        context.Process(target=_hammer, args=(uri, start, 20, results))
+        for _ in range(8)
+    ]
+    for worker in workers:
+        worker.start()
+    allowed = sum(results.get(timeout=30) for _ in workers)
+    for worker in workers:
+        worker.join()
+    assert allowed == 50
+
+
+@pytest.fixture
+def quota(uri):
+    return TokenQuota(SQLiteStorage(uri), parse("100 per hour"), parse("1000 per hour"))
+
+
+def test_quota_allows_until_spent(quota, clock):
+    quota.check("a", False)
+    quota.charge("a", False, 60)
+    quota.check("a", False)
+    # Usage is only known afterwards, so the call that crosses the limit is
+    # allowed and charged in full.
+    quota.charge("a", False, 60)
+    with pytest.raises(QuotaExceeded) as raised:
+        quota.check("a", False)
+    assert 1 <= raised.value.retry_after <= 3600
+    quota.check("b", False)
+
+
+def test_authenticated_callers_get_their_own_limit(quota, clock):
+    quota.charge("a", True, 500)
+    quota.check("a", True)
+    quota.charge("a", True, 600)
+    with pytest.raises(QuotaExceeded):
+        quota.check("a", True)
+
+
+def test_zero_charge_is_ignored(quota, clock):
+    quota.charge("a", False, 0)
+    quota.charge("a", False, -5)
+    assert (
+        quota.storage.get_sliding_window(
+            quota.limit.key_for("a"), quota.limit.get_expiry()
+        )[2]
+        == 0
+    )
+
+
+def test_quota_recovers_after_the_window(quota, clock):
+    quota.charge("a", False, 150)
+    with pytest.raises(QuotaExceeded) as raised:
+        quota.check("a", False)
+    clock[0] += 2 * 3600
+    quota.check("a", False)
+    assert raised.value.retry_after > 0
@@ -0,0 +1,97 @@
+import json
+
+import pytest
+
+import themes
+
+DEFAULT = themes.dump(themes.DEFAULT_THEME)
+
+
+def assert_valid(theme):
+    assert themes.theme_validator.is_valid(json.loads(theme))
+
+
+@pytest.mark.parametrize(
+    "style",
+    [
+        "A red theme with dark mode",
+        "A dark mode green theme",
+        "A pitch black AMOLED theme with cyan accents",
+        "A pitch- black red theme",
+        "A pitch-black red theme",
+        "a mint green theme",
+        "#abc dark theme",
+        "The default orange theme, dark mode",
+        'Make this theme dark mode: {"orange":"#f00","tinting":"#abc"}',
+        'Make this theme light mode: {"orange":"#00bfff","tinting":"#00171f"}',
+    ],
+)
+def test_synthesized_themes_match_the_schema(style):
+    theme = themes.synthesize(style)
+    assert theme is not None
+    assert_valid(theme)
+
+
+def test_default_theme_is_returned_exactly():
+    assert themes.synthesize("The default orange theme") == DEFAULT
+
+
+@pytest.mark.parametrize(
+    "style, key, expected",
+    [
+        ("A pitch- black red theme", "background", "#000000"),
+        ("A dark mode green theme", "background", "#181818"),
+        ("red", "background", "#ffffff"),
+        ("a cobalt blue theme", "orange", "#0047ab"),
+        (
+            'Make this theme dark mode: {"orange":"#f00","tinting":"#abc"}',
+            "tinting",
+            "#aabbcc",
+        ),
+    ],
+)
+def test_synthesized_values(style, key, expected):
+    assert json.loads(themes.synthesize(style))[key] == expected
+
+
+@pytest.mark.parametrize(
+    "style",
+    [
+        "The default orange theme but turqouise",
+        "Android holo ui colours with dark background and blue accents",
+        "A red and blue theme",
+        "A dark light red theme",
+        "A theme based on the colors of the Google Turtle Emoji",
+        "Make this theme dark mode: {not json}",
+        'Make this theme dark mode: {"tinting":"#000000"}',
+    ],
+)
+def test_hands_off_to_the_model(style):
+    assert themes.synthesize(style) is None
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        DEFAULT,
+        json.dumps(themes.DEFAULT_THEME, indent=2),
+        "```json\n" + DEFAULT + "\n```",
+    ],
+)
+def test_parse_theme_accepts_valid_themes(text):
+    assert themes.parse_theme(text) == DEFAULT
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "Here is your theme!",
+        "[]",
+        json.dumps({**themes.DEFAULT_THEME, "v": 2}),
+        json.dumps({**themes.DEFAULT_THEME, "tinting": "#abc"}),
+        json.dumps({**themes.DEFAULT_THEME, "orange": "orange"}),
+        json.dumps({k: v for k, v in themes.DEFAULT_THEME.items() if k != "tinting"}),
+    ],
+)
+def test_parse_theme_rejects_invalid_themes(text):
+    assert themes.parse_theme(text) is None